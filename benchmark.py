@@ -0,0 +1,208 @@
+#!/usr/bin/python3
+"""Time the parser, the page builder and the TTS pipeline at several script sizes.
+
+Scripts of each size are built by repeating full_drama.txt. The TTS pipeline
+runs with the sine backend and the energy VAD, so no GPU nor network is needed.
+Results are written as JSON. Given a previous results file, --baseline reports
+every benchmark slower than it by more than --threshold, and exits with status 1.
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable
+
+from drama import CHARACTER_PATTERN, SCENE_KEYWORD, Drama, split_character_lines, split_lines_into_blocks
+
+DRAMA_FILE = "full_drama.txt"
+RESULTS_FILE = "benchmark_results.json"
+GROUPS = ["drama", "rehearsal", "tts"]
+SIZES = [1000, 10000, 100000]  # Dialogues
+TTS_SIZES = [50, 200]  # Every line is synthesized
+
+
+def scaled_script(source_lines: list[str], n_dialogues: int) -> list[str]:
+    """A script of n_dialogues dialogues, repeating the acts of a source script."""
+    title, body = source_lines[0], source_lines[1:]
+    if not any(CHARACTER_PATTERN.match(line) for line in body):
+        raise ValueError("The source script has no dialogue to repeat")
+    lines = [title]
+    count = 0
+    while True:
+        for line in body:
+            if CHARACTER_PATTERN.match(line):
+                if count == n_dialogues:
+                    return lines
+                count += 1
+            lines.append(line)
+
+
+def time_runs(run: Callable[[], object], repeat: int, setup: Callable[[], None] | None = None) -> list[float]:
+    """Durations of repeated calls of run(), each after an untimed setup(). Output is silenced."""
+    durations: list[float] = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            run()
+            durations.append(time.perf_counter() - start)
+    return durations
+
+
+def bench_drama(drama_txt: str, repeat: int) -> dict[str, list[float]]:
+    with open(drama_txt, "r") as file:
+        lines = [line.strip() for line in file]
+    scene_lines = split_lines_into_blocks(lines[1:], SCENE_KEYWORD)
+    return {
+        "drama.from_file": time_runs(lambda: Drama.from_file(drama_txt), repeat),
+        "drama.from_lines": time_runs(lambda: Drama.from_lines(lines), repeat),
+        "drama.split_lines_into_blocks": time_runs(lambda: split_lines_into_blocks(lines, SCENE_KEYWORD), repeat),
+        "drama.split_character_lines": time_runs(
+            lambda: [split_character_lines(block) for block in scene_lines], repeat),
+    }
+
+
+def bench_rehearsal(drama_txt: str, repeat: int, work_dir: str) -> dict[str, list[float]]:
+    from generate_rehearsal import generate_drama_data, render_html
+
+    drama = Drama.from_file(drama_txt)
+    tts_dir = os.path.join(work_dir, "tts-output")  # Missing: audio paths are only computed
+    drama_data = generate_drama_data(drama, tts_dir)
+
+    def write_html() -> None:
+        with open(os.path.join(work_dir, "index.html"), "w", encoding="utf-8") as f:
+            f.write(render_html(drama_data))
+
+    return {
+        "rehearsal.generate_drama_data": time_runs(lambda: generate_drama_data(drama, tts_dir), repeat),
+        "rehearsal.write_html": time_runs(write_html, repeat),
+    }
+
+
+def bench_tts(drama_txt: str, repeat: int, work_dir: str) -> dict[str, list[float]]:
+    import generate_tts
+    # Imported by the first synthesis otherwise, which would time it
+    import trim_tts
+    import tts_backends
+
+    output_dir = ""
+
+    def new_output_dir() -> None:
+        nonlocal output_dir
+        output_dir = tempfile.mkdtemp(prefix="tts-output-", dir=work_dir)
+
+    def run_tts() -> None:
+        argv = sys.argv
+        sys.argv = ["generate_tts.py", "--drama", drama_txt, "--output-dir", output_dir,
+                    "--backend", "sine", "--vad", "energy", "--device", "cpu"]
+        try:
+            generate_tts.main()
+        finally:
+            sys.argv = argv
+
+    return {
+        "tts.synthesize_all": time_runs(run_tts, repeat, setup=new_output_dir),
+        "tts.all_cached": time_runs(run_tts, repeat),  # Into the last output directory
+    }
+
+
+def run_benchmarks(source_txt: str, groups: list[str], sizes: list[int], tts_sizes: list[int],
+                   repeat: int) -> dict[str, dict[str, dict]]:
+    """Run the benchmarks of the given groups. Return name -> size -> statistics."""
+    with open(source_txt, "r") as file:
+        source_lines = [line.strip() for line in file]
+
+    results: dict[str, dict[str, dict]] = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for group in groups:
+            for size in (tts_sizes if group == "tts" else sizes):
+                work_dir = os.path.join(tmp_dir, f"{group}-{size}")
+                os.makedirs(work_dir)
+                drama_txt = os.path.join(work_dir, "drama.txt")
+                with open(drama_txt, "w") as f:
+                    f.write("\n".join(scaled_script(source_lines, size)) + "\n")
+
+                print(f"{group}: {size} dialogues...")
+                if group == "drama":
+                    durations = bench_drama(drama_txt, repeat)
+                elif group == "rehearsal":
+                    durations = bench_rehearsal(drama_txt, repeat, work_dir)
+                else:
+                    durations = bench_tts(drama_txt, repeat, work_dir)
+                for name, runs in durations.items():
+                    results.setdefault(name, {})[str(size)] = {
+                        "median_s": statistics.median(runs), "min_s": min(runs), "runs": len(runs)}
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Print each benchmark against the baseline. Return the ones slower by more than threshold."""
+    regressions: list[str] = []
+    print(f"{'benchmark':<34} {'size':>7} {'median':>10} {'baseline':>10} {'change':>8}")
+    for name, by_size in results.items():
+        for size, stats in by_size.items():
+            reference = baseline.get(name, {}).get(size)
+            line = f"{name:<34} {size:>7} {stats['median_s'] * 1000:>8.1f}ms"
+            if reference is None:
+                print(line)
+                continue
+            change = stats["median_s"] / reference["median_s"] - 1
+            flag = "  REGRESSION" if change > threshold else ""
+            print(f"{line} {reference['median_s'] * 1000:>8.1f}ms {change:>+8.1%}{flag}")
+            if flag:
+                regressions.append(f"{name} ({size} dialogues)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--drama", default=DRAMA_FILE, help="Script repeated to build each size")
+    parser.add_argument("--groups", default=",".join(GROUPS), help=f"Comma-separated subset of: {', '.join(GROUPS)}")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)), help="Dialogues per script")
+    parser.add_argument("--tts-sizes", default=",".join(map(str, TTS_SIZES)), help="Dialogues per TTS script")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per benchmark, the median is kept")
+    parser.add_argument("--output", default=RESULTS_FILE)
+    parser.add_argument("--baseline", help="Results file of a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Relative slowdown of the median reported as a regression")
+    args = parser.parse_args()
+
+    groups = args.groups.split(",")
+    for group in groups:
+        if group not in GROUPS:
+            parser.error(f"Unknown group: {group}")
+
+    results = run_benchmarks(args.drama, groups, [int(size) for size in args.sizes.split(",")],
+                             [int(size) for size in args.tts_sizes.split(",")], args.repeat)
+    report = {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.threshold)
+    print(f"Results in {args.output}")
+    if regressions:
+        print(f"{len(regressions)} regressions above {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
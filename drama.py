@@ -1,20 +1,108 @@
 #!/usr/bin/python3
 """Drama."""
-from dataclasses import dataclass
+import argparse
+import bisect
+import difflib
+import hashlib
+import json
+import sys
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator
 
 
 import re
 
+ACT_KEYWORD = "=act="
+SCENE_KEYWORD = "*scene*"
+CHARACTER_PATTERN = re.compile(r"<([^>]+)>")
+EDIT_SIMILARITY = 0.4  # Text similarity from which a replaced line of the same character is an edit of it
+MAX_EDIT_PAIRS = 250_000  # Larger replaced blocks are taken as removed then added, without comparing lines
+NUMBERING_SUFFIX = ".numbers.jsonl"
 
 
+def normalize_character(name: str) -> str:
+    """Key of a character name, used to match voices and rehearsed characters."""
+    return name.lower()
+
+
+class Character:
+    """A character of the drama, shared by all of its dialogues."""
+    __slots__ = ("name", "key", "voice")
+
+    def __init__(self, name: str, voice: str | None = None):
+        self.name = sys.intern(name)
+        self.key = normalize_character(name)
+        self.voice = voice  # Speaker of the TTS model, see Drama.assign_voices()
+
+    def __str__(self) -> str:
+        return self.name
+
+    def __repr__(self) -> str:
+        return f"Character({self.name!r})"
+
+
+class Dialogue:
+    """A line of a character. Unpacks like the (character name, text) tuple it replaces."""
+    __slots__ = ("character", "text")
+
+    def __init__(self, character: Character, text: str):
+        self.character = character
+        self.text = text
+
+    def __iter__(self) -> Iterator[str]:
+        return iter((self.character.name, self.text))
+
+    def __len__(self) -> int:
+        return 2
+
+    def __getitem__(self, index):
+        return (self.character.name, self.text)[index]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (Dialogue, tuple)):
+            return tuple(self) == tuple(other)
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash((self.character.name, self.text))
+
+    def __repr__(self) -> str:
+        return f"Dialogue({self.character.name!r}, {self.text!r})"
+
 
 @dataclass
 class Scene:
     """aaaaaaaaaa"""
-    dialogues: list[tuple[str, str]]  # List of (character, dialogue) tuples
+    dialogues: list[Dialogue]  # (character, dialogue) tuples are converted
+    spans: list[tuple[int, int]] = field(default_factory=list)  # First and last source line of each dialogue
+    numbers: list[int] = field(default_factory=list)  # Number of each dialogue, used in its file name
+    span: tuple[int, int] | None = None
+    ids: list[str] = field(default_factory=list)  # Stable ID of each dialogue, set by Drama
+    next_number: int = 0  # Number of the next dialogue added, after every number the scene ever had
+    characters: set[Character] = field(init=False, compare=False, repr=False)  # Characters speaking
+
+    def __post_init__(self):
+        # Tuples of the same name share a Character, as in iter_acts()
+        characters: dict[str, Character] = {}
+        dialogues: list[Dialogue] = []
+        for dialogue in self.dialogues:
+            if not isinstance(dialogue, Dialogue):
+                name, text = dialogue
+                character = characters.get(name) or characters.setdefault(name, Character(name))
+                dialogue = Dialogue(character, text)
+            dialogues.append(dialogue)
+        self.dialogues = dialogues
+        self.characters = {dialogue.character for dialogue in self.dialogues}
+        if not self.numbers:
+            self.numbers = list(range(1, len(self.dialogues) + 1))
+        self.next_number = max(self.next_number, max(self.numbers, default=0) + 1)
+
+    @property
+    def line_count(self) -> int:
+        return len(self.dialogues)
 
     @staticmethod
-    def from_lines(lines: list[str]) -> 'Scene':
+    def from_lines(lines: Iterable[str]) -> 'Scene':
         """Load a Scene from text lines."""
         return Scene(dialogues=split_character_lines(lines))
 
@@ -23,12 +111,13 @@ class Scene:
 class Act:
     """A container for multiple scenes (WordSpeakerMap objects)."""
     scenes: list[Scene]
+    span: tuple[int, int] | None = None
 
     @staticmethod
-    def from_lines(lines: list[str]) -> 'Act':
+    def from_lines(lines: Iterable[str]) -> 'Act':
         """Load an Act from text lines."""
         return Act(scenes=[Scene.from_lines(scene_lines)
-                           for scene_lines in split_lines_into_blocks(lines, "*scene*")])
+                           for scene_lines in split_lines_into_blocks(lines, SCENE_KEYWORD)])
 
 
 @dataclass
@@ -36,24 +125,42 @@ class Drama:
     """The complete play, containing a sequence of Acts."""
     title: str
     acts: list[Act]
+    characters: dict[str, Character] = field(init=False, compare=False, repr=False)  # By name
+
+    def __post_init__(self):
+        # Each character is a single object across the play
+        self.characters = {}
+        # Repeated lines of a character are told apart by their occurrence in the play
+        occurrences: dict[tuple[str, str], int] = {}
+        for act in self.acts:
+            for scene in act.scenes:
+                scene.ids = []
+                for dialogue in scene.dialogues:
+                    character = self.characters.setdefault(dialogue.character.name, dialogue.character)
+                    dialogue.character = character
+                    content = (character.key, normalize_text(dialogue.text))
+                    occurrence = occurrences.get(content, 0)
+                    occurrences[content] = occurrence + 1
+                    scene.ids.append(dialogue_id(*content, occurrence))
+                scene.characters = {dialogue.character for dialogue in scene.dialogues}
+
+    def assign_voices(self, voice_map: dict[str, str]) -> None:
+        """Set the voice of each character from a map of normalized names, None if missing."""
+        for character in self.characters.values():
+            character.voice = voice_map.get(character.key)
 
     @staticmethod
     def from_file(drama_txt: str) -> 'Drama':
         """Load a Drama from a text file."""
         with open(drama_txt, "r") as file:
-            lines = [line.strip() for line in file]
-            return Drama.from_lines(lines)
+            return Drama.from_lines(file)
 
     @staticmethod
-    def from_lines(lines: list[str]) -> 'Drama':
-        """Load a Drama from text lines. First line is title."""
-        title = lines[0] if lines else ""
-        remaining = lines[1:]
-        return Drama(
-            title=title,
-            acts=[Act.from_lines(act_lines)
-                  for act_lines in split_lines_into_blocks(remaining, "=act=")]
-        )
+    def from_lines(lines: Iterable[str]) -> 'Drama':
+        """Load a Drama from text lines, or a text file object. First line is title."""
+        line_iter = iter(lines)
+        title = next(line_iter, "").strip()
+        return Drama(title=title, acts=list(iter_acts(line_iter, first_line=2)))
 
     def print(self) -> None:
         """Print the Drama structure."""
@@ -65,7 +172,333 @@ class Drama:
                     print(f"    {character}: {dialogue}")
 
 
-def split_lines_into_blocks(lines: list[str],
+def normalize_text(text: str) -> str:
+    """Collapse whitespace, so that reformatting a line does not change its ID."""
+    return " ".join(text.split())
+
+
+def dialogue_id(character: str, text: str, occurrence: int = 0) -> str:
+    """Content-derived ID of a dialogue, independent of its position in the scene."""
+    content = json.dumps([character.lower(), normalize_text(text), occurrence], ensure_ascii=False)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+
+
+def iter_acts(lines: Iterable[str], first_line: int = 1) -> Iterator[Act]:
+    """Parse the lines following the title into Acts, each yielded once its last line is read.
+
+    lines can be a text file object: see iter_scenes().
+    """
+    scenes: list[Scene] = []
+    for _, block in _iter_blocks(lines, first_line):
+        if isinstance(block, Scene):
+            scenes.append(block)
+        else:
+            yield Act(scenes=scenes, span=block)
+            scenes = []
+
+
+def iter_scenes(lines: Iterable[str], first_line: int = 1) -> Iterator[tuple[int, int, Scene]]:
+    """Parse the lines following the title into (act index, scene index, Scene), from 1.
+
+    Each Scene is yielded as soon as its last line is read, so that only one
+    scene is in memory at a time. lines can be a text file object, or any
+    iterable of lines: they are stripped here.
+    """
+    scene_idx = 0
+    for act_idx, block in _iter_blocks(lines, first_line):
+        if isinstance(block, Scene):
+            scene_idx += 1
+            yield act_idx, scene_idx, block
+        else:
+            scene_idx = 0
+
+
+def iter_dialogues(lines: Iterable[str], first_line: int = 1) -> Iterator[tuple[int, int, Dialogue]]:
+    """Parse the lines following the title into (act index, scene index, Dialogue), from 1."""
+    for act_idx, scene_idx, scene in iter_scenes(lines, first_line):
+        for dialogue in scene.dialogues:
+            yield act_idx, scene_idx, dialogue
+
+
+def _iter_blocks(lines: Iterable[str], first_line: int) -> Iterator[tuple[int, Scene | tuple[int, int]]]:
+    """Parse lines in a single pass into (act index, Scene), then (act index, act span) at the end of each act.
+
+    Same rules as splitting into act blocks, then scene blocks, then
+    dialogues: marker lines separate blocks, blocks without any line are
+    dropped, and lines before the first character of a scene are ignored.
+    Scenes carry the source line spans of their dialogues (numbered from
+    first_line).
+    """
+    dialogues: list[Dialogue] = []
+    spans: list[tuple[int, int]] = []
+    characters: dict[str, Character] = {}
+    character = None
+    character_lines: list[str] = []
+    character_start = 0
+    act_idx = 0
+    act_start = None
+    scene_start = None
+    line_number = first_line - 1
+
+    for line_number, line in enumerate(lines, start=first_line):
+        line = line.strip()
+        line_lower = line.lower()
+        is_act_marker = ACT_KEYWORD in line_lower
+        if is_act_marker or SCENE_KEYWORD in line_lower:
+            if character is not None:
+                dialogues.append(Dialogue(character, "\n".join(character_lines)))
+                spans.append((character_start, line_number - 1))
+                character = None
+            if scene_start is not None:
+                yield act_idx, Scene(dialogues=dialogues, spans=spans, span=(scene_start, line_number - 1))
+                dialogues = []
+                spans = []
+                scene_start = None
+            if is_act_marker:
+                if act_start is not None:
+                    yield act_idx, (act_start, line_number - 1)
+                    act_start = None
+            elif act_start is None:
+                act_start = line_number
+                act_idx += 1
+            continue
+
+        if act_start is None:
+            act_start = line_number
+            act_idx += 1
+        if scene_start is None:
+            scene_start = line_number
+        match = CHARACTER_PATTERN.match(line)
+        if match:
+            if character is not None:
+                dialogues.append(Dialogue(character, "\n".join(character_lines)))
+                spans.append((character_start, line_number - 1))
+            name = match.group(1)
+            character = characters.get(name) or characters.setdefault(name, Character(name))
+            character_lines = [line[match.end():].strip()]
+            character_start = line_number
+        elif character is not None:
+            character_lines.append(line)
+
+    if character is not None:
+        dialogues.append(Dialogue(character, "\n".join(character_lines)))
+        spans.append((character_start, line_number))
+    if scene_start is not None:
+        yield act_idx, Scene(dialogues=dialogues, spans=spans, span=(scene_start, line_number))
+    if act_start is not None:
+        yield act_idx, (act_start, line_number)
+
+
+@dataclass
+class DialogueChange:
+    """A dialogue of an incremental re-parse, located by act, scene (from 1) and number."""
+    act_idx: int
+    scene_idx: int
+    number: int
+    character: str
+    previous: tuple[int, int, int] | None = None  # (act_idx, scene_idx, number) before the edit
+
+
+@dataclass
+class DramaDiff:
+    """Dialogues changed between two parses. Unchanged dialogues keep their number."""
+    added: list[DialogueChange] = field(default_factory=list)
+    removed: list[DialogueChange] = field(default_factory=list)
+    edited: list[DialogueChange] = field(default_factory=list)  # Text or character changed
+    renumbered: list[DialogueChange] = field(default_factory=list)  # Same content, moved to another scene
+
+    def print(self) -> None:
+        """Print the changes."""
+        for label, changes in (("+", self.added), ("-", self.removed),
+                               ("~", self.edited), (">", self.renumbered)):
+            for change in changes:
+                moved = f" (was act {change.previous[0]} scene {change.previous[1]} #{change.previous[2]})" \
+                    if change.previous and label == ">" else ""
+                print(f"{label} act {change.act_idx} scene {change.scene_idx} "
+                      f"#{change.number:03d} {change.character}{moved}")
+
+
+def _flatten(drama: Drama) -> list[tuple[int, int, int, int, tuple[str, str], str]]:
+    """(act_idx, scene_idx, position, number, dialogue, ID) of every dialogue, in order."""
+    return [(act_idx, scene_idx, position, number, dialogue, dialogue_id)
+            for act_idx, act in enumerate(drama.acts, start=1)
+            for scene_idx, scene in enumerate(act.scenes, start=1)
+            for position, (number, dialogue, dialogue_id) in enumerate(zip(scene.numbers, scene.dialogues,
+                                                                           scene.ids))]
+
+
+def _common_subsequence(old_ids: list[str], new_ids: list[str]) -> list[tuple[int, int]]:
+    """(old, new) positions of a longest common subsequence of two lists of unique IDs.
+
+    With unique items, it is a longest increasing subsequence of the old
+    positions of the new IDs, found in O(n log n).
+    """
+    old_positions = {dialogue_id: idx for idx, dialogue_id in enumerate(old_ids)}
+    pairs = [(old_positions[dialogue_id], new_idx) for new_idx, dialogue_id in enumerate(new_ids)
+             if dialogue_id in old_positions]
+    tails: list[int] = []  # Smallest last old position of a subsequence of each length
+    tail_pairs: list[int] = []  # Index in pairs of that last item
+    links: list[int] = []  # Index in pairs of the item before each one, -1 for none
+    for pair_idx, (old_idx, _) in enumerate(pairs):
+        length = bisect.bisect_left(tails, old_idx)
+        if length == len(tails):
+            tails.append(old_idx)
+            tail_pairs.append(pair_idx)
+        else:
+            tails[length] = old_idx
+            tail_pairs[length] = pair_idx
+        links.append(tail_pairs[length - 1] if length else -1)
+
+    subsequence: list[tuple[int, int]] = []
+    pair_idx = tail_pairs[-1] if tail_pairs else -1
+    while pair_idx != -1:
+        subsequence.append(pairs[pair_idx])
+        pair_idx = links[pair_idx]
+    return subsequence[::-1]
+
+
+def _pair_edits(old_dialogues: list[tuple[str, str]],
+                new_dialogues: list[tuple[str, str]]) -> list[tuple[int, int]]:
+    """(old, new) positions of the dialogues of a replaced block that edit one another.
+
+    Only dialogues of the same character whose texts are similar enough are
+    paired, the most similar first. The others are removed or added.
+    """
+    if not old_dialogues or not new_dialogues or len(old_dialogues) * len(new_dialogues) > MAX_EDIT_PAIRS:
+        return []
+    candidates: list[tuple[float, int, int]] = []
+    matcher = difflib.SequenceMatcher(autojunk=False)
+    for new_idx, (new_character, new_text) in enumerate(new_dialogues):
+        matcher.set_seq2(normalize_text(new_text))
+        for old_idx, (old_character, old_text) in enumerate(old_dialogues):
+            if old_character != new_character:
+                continue
+            matcher.set_seq1(normalize_text(old_text))
+            if matcher.real_quick_ratio() < EDIT_SIMILARITY or matcher.quick_ratio() < EDIT_SIMILARITY:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= EDIT_SIMILARITY:
+                candidates.append((-ratio, old_idx, new_idx))
+
+    pairs: list[tuple[int, int]] = []
+    paired_old: set[int] = set()
+    paired_new: set[int] = set()
+    for _, old_idx, new_idx in sorted(candidates):
+        if old_idx not in paired_old and new_idx not in paired_new:
+            paired_old.add(old_idx)
+            paired_new.add(new_idx)
+            pairs.append((old_idx, new_idx))
+    return pairs
+
+
+def reparse(previous: Drama, lines: Iterable[str]) -> tuple[Drama, DramaDiff]:
+    """Parse the new text of a drama, numbering its dialogues from the previous parse.
+
+    A dialogue found again in the same scene keeps its number, even when lines
+    are inserted or removed before it, so that its file name does not change.
+    An edited dialogue (same character, similar text) keeps its number too.
+    Dialogues new to a scene get numbers from its next_number, so that the
+    number of a deleted dialogue is never given to another one.
+    """
+    drama = Drama.from_lines(lines)
+    old = _flatten(previous)
+    new = _flatten(drama)
+    diff = DramaDiff()
+
+    # Each new dialogue is matched to the old one it is equal to (same ID), or
+    # that it edits, among the old dialogues between the same two equal ones
+    matches: dict[int, tuple[int, bool]] = {}  # New index -> (old index, edited)
+    old_start = new_start = 0
+    for old_end, new_end in _common_subsequence([item[5] for item in old], [item[5] for item in new]) + \
+            [(len(old), len(new))]:
+        for old_offset, new_offset in _pair_edits([item[4] for item in old[old_start:old_end]],
+                                                  [item[4] for item in new[new_start:new_end]]):
+            matches[new_start + new_offset] = (old_start + old_offset, True)
+        if new_end < len(new):
+            matches[new_end] = (old_end, False)
+        old_start, new_start = old_end + 1, new_end + 1
+
+    next_numbers = {(act_idx, scene_idx): scene.next_number
+                    for act_idx, act in enumerate(previous.acts, start=1)
+                    for scene_idx, scene in enumerate(act.scenes, start=1)}
+
+    matched_old: set[int] = set()
+    for new_idx, (act_idx, scene_idx, position, _, (character, _), _) in enumerate(new):
+        scene = drama.acts[act_idx - 1].scenes[scene_idx - 1]
+        match = matches.get(new_idx)
+        if match is not None:
+            old_act, old_scene, _, old_number, _, _ = old[match[0]]
+            matched_old.add(match[0])
+            previous_location = (old_act, old_scene, old_number)
+            if (old_act, old_scene) == (act_idx, scene_idx):
+                scene.numbers[position] = old_number
+                if match[1]:
+                    diff.edited.append(DialogueChange(act_idx, scene_idx, old_number, character, previous_location))
+                continue
+
+        number = next_numbers.get((act_idx, scene_idx), 1)
+        next_numbers[(act_idx, scene_idx)] = number + 1
+        scene.numbers[position] = number
+        change = DialogueChange(act_idx, scene_idx, number, character,
+                                previous_location if match is not None else None)
+        if match is None:
+            diff.added.append(change)
+        elif match[1]:
+            diff.edited.append(change)
+        else:
+            diff.renumbered.append(change)
+
+    for old_idx, (act_idx, scene_idx, _, number, (character, _), _) in enumerate(old):
+        if old_idx not in matched_old:
+            diff.removed.append(DialogueChange(act_idx, scene_idx, number, character))
+    for act_idx, act in enumerate(drama.acts, start=1):
+        for scene_idx, scene in enumerate(act.scenes, start=1):
+            scene.next_number = max(next_numbers.get((act_idx, scene_idx), 1), max(scene.numbers, default=0) + 1)
+    return drama, diff
+
+
+def dump_numbering(drama: Drama) -> str:
+    """The numbering of a drama, as JSON lines: the title, then each scene and its dialogues.
+
+    Each dialogue is a [number, character, text] line. The text is kept so
+    that the next version can be re-parsed against it (see reparse()).
+    """
+    records: list = [{"title": drama.title}]
+    for act_idx, act in enumerate(drama.acts, start=1):
+        for scene_idx, scene in enumerate(act.scenes, start=1):
+            records.append({"act": act_idx, "scene": scene_idx, "next_number": scene.next_number})
+            records.extend([number, dialogue.character.name, dialogue.text]
+                           for number, dialogue in zip(scene.numbers, scene.dialogues))
+    return "".join(f"{json.dumps(record, ensure_ascii=False)}\n" for record in records)
+
+
+def load_numbering(numbering_path: str) -> Drama:
+    """Load the Drama recorded by dump_numbering(). Raises ValueError if the file is invalid."""
+    acts: list[list[dict]] = []
+    scene = None
+    with open(numbering_path, "r", encoding="utf-8") as file:
+        try:
+            title = json.loads(next(file, '{"title": ""}'))["title"]
+            for line in file:
+                record = json.loads(line)
+                if isinstance(record, dict):
+                    while len(acts) < record["act"]:
+                        acts.append([])
+                    scenes = acts[record["act"] - 1]
+                    while len(scenes) < record["scene"]:
+                        scenes.append({"dialogues": [], "numbers": [], "next_number": 0})
+                    scene = scenes[record["scene"] - 1]
+                    scene["next_number"] = record["next_number"]
+                else:
+                    number, character, text = record
+                    scene["dialogues"].append((character, text))
+                    scene["numbers"].append(number)
+        except (KeyError, TypeError, ValueError) as error:
+            raise ValueError(f"Invalid numbering file {numbering_path}: {error!r}") from error
+    return Drama(title=title, acts=[Act(scenes=[Scene(**scene) for scene in scenes]) for scenes in acts])
+
+
+def split_lines_into_blocks(lines: Iterable[str],
                             keyword: str) -> list[list[str]]:
     """Split a list of lines into blocks whenever a line contains a given keyword."""
     blocks: list[list[str]] = []
@@ -86,14 +519,14 @@ def split_lines_into_blocks(lines: list[str],
     return blocks
 
 
-def split_character_lines(lines: list[str]) -> list[tuple[str, str]]:
+def split_character_lines(lines: Iterable[str]) -> list[tuple[str, str]]:
     """Split lines into (character, lines) tuples."""
     result: list[tuple[str, str]] = []
     current_character = None
     current_lines: list[str] = []
 
     for line in lines:
-        match = re.match(r"<([^>]+)>", line)
+        match = CHARACTER_PATTERN.match(line)
         if match:
             if current_character is not None:
                 result.append((current_character, "\n".join(current_lines)))
@@ -107,3 +540,26 @@ def split_character_lines(lines: list[str]) -> list[tuple[str, str]]:
         result.append((current_character, "\n".join(current_lines)))
 
     return result
+
+
+def print_changes(previous: Drama, new_txt: str) -> DramaDiff:
+    """Print the dialogues changed in a new version of a drama file, and their counts."""
+    with open(new_txt, "r") as file:
+        _, diff = reparse(previous, [line.strip() for line in file])
+    diff.print()
+    print(f"{len(diff.added)} added, {len(diff.removed)} removed, "
+          f"{len(diff.edited)} edited, {len(diff.renumbered)} renumbered")
+    return diff
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the dialogues changed between two versions of a drama.")
+    parser.add_argument("previous_txt")
+    parser.add_argument("new_txt")
+    args = parser.parse_args()
+
+    print_changes(Drama.from_file(args.previous_txt), args.new_txt)
+
+
+if __name__ == "__main__":
+    main()
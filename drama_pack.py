@@ -0,0 +1,421 @@
+#!/usr/bin/python3
+"""Compact binary format of a parsed Drama, loaded through mmap with lazy views.
+
+Character names are stored once, the UTF-8 text of each scene as one zlib
+stream, and acts, scenes and dialogues as arrays of offsets into each other.
+Loading only maps the file: a scene's text is decompressed when it is read.
+Each integer array is little-endian, in the narrowest of uint8, uint16 and
+uint32 that holds its values, so a file (and its text) must stay below 4 GiB.
+"""
+import argparse
+import array
+import bisect
+import contextlib
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+from typing import Iterator, Sequence
+
+from drama import NUMBERING_SUFFIX, Character, Dialogue, Drama, dump_numbering, load_numbering, reparse
+
+MAGIC = b"PDRM"
+VERSION = 4
+HEADER = struct.Struct("<4sHH32s32sIIII")  # magic, version, flags, source and numbering SHA-256, counts
+SECTIONS = [
+    "title",
+    "character_offsets",  # Into character_blob, n_characters + 1
+    "character_blob",
+    "act_scene_starts",  # First scene of each act, n_acts + 1
+    "scene_dialogue_starts",  # First dialogue of each scene, n_scenes + 1
+    "dialogue_characters",  # Index of the character of each dialogue
+    "text_offsets",  # Into the decompressed text of the play, n_dialogues + 1
+    "scene_text_offsets",  # Into text_blob, n_scenes + 1
+    "text_blob",  # One zlib stream per scene
+    "numbers",
+    "scene_next_numbers",
+    "ids",  # 8 bytes per dialogue
+    "spans",  # First and last source line of each dialogue, 0 if unknown
+    "scene_spans",
+    "act_spans",
+]
+SECTION_TABLE = struct.Struct(f"<{3 * len(SECTIONS)}Q")  # Offset, length and item size of each section
+TYPECODES = {1: "B", 2: "H", 4: "I"}
+PACK_SUFFIX = ".pack"
+
+
+def _integer_bytes(values) -> tuple[bytes, int]:
+    """Values in the narrowest unsigned array that holds them, and its item size."""
+    largest = max(values, default=0)
+    typecode = "B" if largest < 1 << 8 else "H" if largest < 1 << 16 else "I"
+    data = array.array(typecode, values)
+    if sys.byteorder == "big":
+        data.byteswap()
+    return data.tobytes(), data.itemsize
+
+
+def _span_values(span: tuple[int, int] | None) -> tuple[int, int]:
+    return span if span is not None else (0, 0)
+
+
+def source_sha256(drama_txt: str) -> bytes:
+    """SHA-256 digest of a drama text file."""
+    digest = hashlib.sha256()
+    with open(drama_txt, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def _write_file(path: str, data: bytes) -> None:
+    """Replace a file through a temporary file, so that it is never partly written."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def save_packed(drama: Drama, pack_path: str, source_digest: bytes = bytes(32),
+                numbering_digest: bytes = bytes(32)) -> None:
+    """Write a Drama in the packed format, through a temporary file."""
+    characters: dict[str, int] = {}
+    act_scene_starts = [0]
+    scene_dialogue_starts = [0]
+    dialogue_characters: list[int] = []
+    text_offsets = [0]
+    scene_text_offsets = [0]
+    scene_texts: list[bytes] = []
+    numbers: list[int] = []
+    scene_next_numbers: list[int] = []
+    ids: list[bytes] = []
+    spans: list[int] = []
+    scene_spans: list[int] = []
+    act_spans: list[int] = []
+
+    for act in drama.acts:
+        for scene in act.scenes:
+            texts: list[bytes] = []
+            for position, dialogue in enumerate(scene.dialogues):
+                dialogue_characters.append(characters.setdefault(dialogue.character.name, len(characters)))
+                encoded = dialogue.text.encode("utf-8")
+                texts.append(encoded)
+                text_offsets.append(text_offsets[-1] + len(encoded))
+                numbers.append(scene.numbers[position])
+                ids.append(bytes.fromhex(scene.ids[position]) if scene.ids else bytes(8))
+                spans.extend(_span_values(scene.spans[position] if scene.spans else None))
+            scene_dialogue_starts.append(len(dialogue_characters))
+            scene_next_numbers.append(scene.next_number)
+            scene_spans.extend(_span_values(scene.span))
+            scene_texts.append(zlib.compress(b"".join(texts), 9))
+            scene_text_offsets.append(scene_text_offsets[-1] + len(scene_texts[-1]))
+        act_scene_starts.append(len(scene_dialogue_starts) - 1)
+        act_spans.extend(_span_values(act.span))
+
+    character_blobs = [name.encode("utf-8") for name in characters]
+    character_offsets = [0]
+    for blob in character_blobs:
+        character_offsets.append(character_offsets[-1] + len(blob))
+
+    sections = {
+        "title": (drama.title.encode("utf-8"), 1),
+        "character_offsets": _integer_bytes(character_offsets),
+        "character_blob": (b"".join(character_blobs), 1),
+        "act_scene_starts": _integer_bytes(act_scene_starts),
+        "scene_dialogue_starts": _integer_bytes(scene_dialogue_starts),
+        "dialogue_characters": _integer_bytes(dialogue_characters),
+        "text_offsets": _integer_bytes(text_offsets),
+        "scene_text_offsets": _integer_bytes(scene_text_offsets),
+        "text_blob": (b"".join(scene_texts), 1),
+        "numbers": _integer_bytes(numbers),
+        "scene_next_numbers": _integer_bytes(scene_next_numbers),
+        "ids": (b"".join(ids), 1),
+        "spans": _integer_bytes(spans),
+        "scene_spans": _integer_bytes(scene_spans),
+        "act_spans": _integer_bytes(act_spans),
+    }
+
+    header = HEADER.pack(MAGIC, VERSION, 0, source_digest, numbering_digest, len(drama.acts),
+                         len(scene_dialogue_starts) - 1, len(dialogue_characters), len(characters))
+    table: list[int] = []
+    body = bytearray()
+    offset = HEADER.size + SECTION_TABLE.size
+    for name in SECTIONS:
+        data, itemsize = sections[name]
+        body.extend(bytes(-(offset + len(body)) % itemsize))  # Arrays stay aligned
+        table.extend((offset + len(body), len(data), itemsize))
+        body.extend(data)
+
+    _write_file(pack_path, header + SECTION_TABLE.pack(*table) + body)
+
+
+class PackedDialogues(Sequence):
+    """The Dialogues of a scene, decoded on access."""
+
+    def __init__(self, pack: "PackedDrama", start: int, end: int):
+        self._pack = pack
+        self._start = start
+        self._end = end
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self._pack.dialogue(self._start + index)
+
+    def __iter__(self) -> Iterator[Dialogue]:
+        for index in range(self._start, self._end):
+            yield self._pack.dialogue(index)
+
+
+class PackedScene:
+    """Read-only view of a packed Scene, with the same attributes."""
+
+    def __init__(self, pack: "PackedDrama", index: int):
+        self._pack = pack
+        self._start = pack.scene_dialogue_starts[index]
+        self._end = pack.scene_dialogue_starts[index + 1]
+        self.span = pack.span("scene_spans", index)
+        self.next_number = pack.scene_next_numbers[index]
+
+    @property
+    def dialogues(self) -> PackedDialogues:
+        return PackedDialogues(self._pack, self._start, self._end)
+
+    @property
+    def numbers(self) -> list[int]:
+        return self._pack.numbers[self._start:self._end].tolist()
+
+    @property
+    def line_count(self) -> int:
+        return self._end - self._start
+
+    @property
+    def characters(self) -> set[Character]:
+        table = self._pack.character_table
+        return {table[index] for index in self._pack.dialogue_characters[self._start:self._end].tolist()}
+
+    @property
+    def ids(self) -> list[str]:
+        return [self._pack.ids[8 * index:8 * index + 8].hex() for index in range(self._start, self._end)]
+
+    @property
+    def spans(self) -> list[tuple[int, int] | None]:
+        return [self._pack.span("spans", index) for index in range(self._start, self._end)]
+
+
+class PackedAct:
+    """Read-only view of a packed Act, with the same attributes."""
+
+    def __init__(self, pack: "PackedDrama", index: int):
+        self._pack = pack
+        self._start = pack.act_scene_starts[index]
+        self._end = pack.act_scene_starts[index + 1]
+        self.span = pack.span("act_spans", index)
+
+    @property
+    def scenes(self) -> list[PackedScene]:
+        return [PackedScene(self._pack, index) for index in range(self._start, self._end)]
+
+
+class PackedDrama:
+    """A packed Drama mapped in memory. Use as a context manager, or close() it.
+
+    Raises ValueError if the file is not a packed drama of this version, or is
+    truncated.
+    """
+
+    def __init__(self, pack_path: str):
+        try:
+            with open(pack_path, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._mmap)
+            self._load()
+        except (ValueError, struct.error) as error:
+            self.close()
+            raise ValueError(f"Not a packed drama (version {VERSION}): {pack_path} ({error})") from error
+
+    def _load(self) -> None:
+        size = len(self._view)
+        if size < HEADER.size + SECTION_TABLE.size:
+            raise ValueError(f"{size} bytes, too short for the header")
+        (magic, version, _, self.source_digest, self.numbering_digest, self.n_acts, self.n_scenes,
+         self.n_dialogues, n_characters) = HEADER.unpack_from(self._view)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"magic {magic!r}, version {version}")
+        table = SECTION_TABLE.unpack_from(self._view, HEADER.size)
+        self._sections = {name: table[3 * idx:3 * idx + 3] for idx, name in enumerate(SECTIONS)}
+        for name, (offset, length, itemsize) in self._sections.items():
+            if offset + length > size or itemsize not in TYPECODES or length % itemsize:
+                raise ValueError(f"section {name} out of bounds")
+
+        self.title = bytes(self._section("title")).decode("utf-8")
+        self.act_scene_starts = self._integers("act_scene_starts", self.n_acts + 1)
+        self.scene_dialogue_starts = self._integers("scene_dialogue_starts", self.n_scenes + 1)
+        self.dialogue_characters = self._integers("dialogue_characters", self.n_dialogues)
+        self.text_offsets = self._integers("text_offsets", self.n_dialogues + 1)
+        self.scene_text_offsets = self._integers("scene_text_offsets", self.n_scenes + 1)
+        self.numbers = self._integers("numbers", self.n_dialogues)
+        self.scene_next_numbers = self._integers("scene_next_numbers", self.n_scenes)
+        self.ids = self._section("ids")
+        self._spans = {"spans": self._integers("spans", 2 * self.n_dialogues),
+                       "scene_spans": self._integers("scene_spans", 2 * self.n_scenes),
+                       "act_spans": self._integers("act_spans", 2 * self.n_acts)}
+        self._text_blob = self._section("text_blob")
+        self._scene_text: tuple[int, bytes] = (-1, b"")
+        if (len(self.ids) != 8 * self.n_dialogues or self.act_scene_starts[-1] != self.n_scenes
+                or self.scene_dialogue_starts[-1] != self.n_dialogues
+                or self.scene_text_offsets[-1] != len(self._text_blob)):
+            raise ValueError("inconsistent counts")
+
+        # Few and repeated: decoded once, into shared Character objects
+        character_offsets = self._integers("character_offsets", n_characters + 1).tolist()
+        character_blob = bytes(self._section("character_blob"))
+        self.character_table = [Character(character_blob[character_offsets[idx]:character_offsets[idx + 1]]
+                                          .decode("utf-8"))
+                                for idx in range(n_characters)]
+        self.characters = {character.name: character for character in self.character_table}
+
+    def _section(self, name: str) -> memoryview:
+        offset, length, _ = self._sections[name]
+        return self._view[offset:offset + length]
+
+    def _integers(self, name: str, count: int):
+        _, length, itemsize = self._sections[name]
+        if length // itemsize != count:
+            raise ValueError(f"section {name} has {length // itemsize} values, not {count}")
+        typecode = TYPECODES[itemsize]
+        if sys.byteorder == "big":
+            values = array.array(typecode, bytes(self._section(name)))
+            values.byteswap()
+            return memoryview(values)
+        return self._section(name).cast(typecode)
+
+    def span(self, name: str, index: int) -> tuple[int, int] | None:
+        """Source span of a dialogue, scene or act, None if unknown."""
+        spans = self._spans[name]
+        first, last = spans[2 * index], spans[2 * index + 1]
+        return (first, last) if first else None
+
+    def dialogue(self, index: int) -> Dialogue:
+        """A dialogue, by its index in the whole play."""
+        scene_idx = bisect.bisect_right(self.scene_dialogue_starts, index) - 1
+        if self._scene_text[0] != scene_idx:  # Dialogues are mostly read scene by scene
+            compressed = self._text_blob[self.scene_text_offsets[scene_idx]:self.scene_text_offsets[scene_idx + 1]]
+            self._scene_text = (scene_idx, zlib.decompress(compressed))
+        base = self.text_offsets[self.scene_dialogue_starts[scene_idx]]
+        text = self._scene_text[1][self.text_offsets[index] - base:self.text_offsets[index + 1] - base]
+        return Dialogue(self.character_table[self.dialogue_characters[index]], text.decode("utf-8"))
+
+    assign_voices = Drama.assign_voices
+
+    @property
+    def acts(self) -> list[PackedAct]:
+        return [PackedAct(self, index) for index in range(self.n_acts)]
+
+    def close(self) -> None:
+        """Release the mapping. Views must not be used anymore."""
+        for values in getattr(self, "_spans", {}).values():
+            values.release()
+        views = [value for value in vars(self).values() if isinstance(value, memoryview)]
+        for view in sorted(views, key=lambda view: view is getattr(self, "_view", None)):
+            view.release()  # The whole view last
+        if hasattr(self, "_mmap"):
+            self._mmap.close()
+
+    def __enter__(self) -> "PackedDrama":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def load_drama(drama_txt: str, write_pack: bool = True) -> Drama | PackedDrama:
+    """Load a drama text file through its packed copy, which is (re)written when outdated.
+
+    Dialogue numbers persist across edits through the numbering file next to
+    the text, with the .numbers.jsonl suffix, which is committed with it: the
+    text is re-parsed against it (see drama.reparse()), and it is rewritten
+    with the new numbers. Without it, the outdated packed copy is used instead.
+
+    The packed copy is next to the text file, with the .pack suffix. It is up to
+    date when it records the SHA-256 of the current text and numbering file.
+    Read-only commands pass write_pack=False: neither file is then written.
+    """
+    pack_path = f"{drama_txt}{PACK_SUFFIX}"
+    numbering_path = f"{drama_txt}{NUMBERING_SUFFIX}"
+    digest = source_sha256(drama_txt)
+    numbering_digest = source_sha256(numbering_path) if os.path.exists(numbering_path) else bytes(32)
+    packed = None
+    if os.path.exists(pack_path):
+        try:
+            packed = PackedDrama(pack_path)
+        except (OSError, ValueError):
+            pass  # Unreadable, truncated or of another version: parsed again and rewritten
+    if packed is not None and (packed.source_digest, packed.numbering_digest) == (digest, numbering_digest):
+        return packed
+
+    with contextlib.ExitStack() as stack:
+        if packed is not None:
+            stack.enter_context(packed)
+        # The previous version: its dialogues keep their numbers
+        previous = load_numbering(numbering_path) if numbering_digest != bytes(32) else packed
+        file = stack.enter_context(open(drama_txt, "r"))
+        drama = reparse(previous, file)[0] if previous is not None else Drama.from_lines(file)
+    if write_pack:
+        numbering = dump_numbering(drama).encode("utf-8")
+        try:
+            if hashlib.sha256(numbering).digest() != numbering_digest:
+                _write_file(numbering_path, numbering)
+                numbering_digest = hashlib.sha256(numbering).digest()
+        except OSError:
+            pass  # Numbered again from the same recorded numbering next time
+        try:
+            save_packed(drama, pack_path, digest, numbering_digest)
+        except OSError:
+            pass  # Read-only location: parse the text each time
+    return drama
+
+
+@contextlib.contextmanager
+def open_drama(drama_txt: str, write_pack: bool = True) -> Iterator[Drama | PackedDrama]:
+    """load_drama() as a context manager, which closes the packed copy on exit."""
+    drama = load_drama(drama_txt, write_pack)
+    try:
+        yield drama
+    finally:
+        if isinstance(drama, PackedDrama):
+            drama.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack a drama text file, and compare load times.")
+    parser.add_argument("drama_txt")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    drama = Drama.from_file(args.drama_txt)
+    parse_time = time.perf_counter() - start
+
+    pack_path = f"{args.drama_txt}{PACK_SUFFIX}"
+    save_packed(drama, pack_path, source_sha256(args.drama_txt))
+
+    start = time.perf_counter()
+    with PackedDrama(pack_path) as packed:
+        load_time = time.perf_counter() - start
+        n_dialogues = packed.n_dialogues
+    print(f"{n_dialogues} dialogues: text parsed in {parse_time * 1000:.1f} ms, "
+          f"packed copy mapped in {load_time * 1000:.2f} ms "
+          f"({os.path.getsize(args.drama_txt)} -> {os.path.getsize(pack_path)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
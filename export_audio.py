@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""Transcode the TTS audio tree to compressed formats for the rehearsal page.
+
+Every WAV of the tts-output tree is encoded with ffmpeg to Opus (in WebM) and
+AAC (in MP4, for Safari), keeping the act<N>/scene<N>/ layout. Files whose
+content and encoding settings did not change since the last export are skipped.
+"""
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from wav_files import find_wav_files
+
+TTS_OUTPUT_DIR = "tts-output"
+EXPORT_DIR = "tts-web"
+MANIFEST_FILE = "manifest.json"
+
+# Ordered by preference: the page plays the first format the browser supports
+AUDIO_FORMATS = {
+    "opus": {
+        "ext": ".webm",
+        "type": 'audio/webm; codecs="opus"',
+        "codec_args": ["-c:a", "libopus", "-application", "voip"],
+        "bitrate": "32k",
+    },
+    "aac": {
+        "ext": ".m4a",
+        "type": 'audio/mp4; codecs="mp4a.40.2"',
+        "codec_args": ["-c:a", "aac", "-movflags", "+faststart"],
+        "bitrate": "48k",
+    },
+}
+
+
+def file_sha256(path: str) -> str:
+    """Hash a file's content."""
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def compressed_path(wav_path: str, tts_dir: str, export_dir: str, audio_format: str) -> str:
+    """Path of the compressed version of a WAV file of the tts-output tree."""
+    relative_path = os.path.relpath(wav_path, tts_dir)
+    return os.path.join(export_dir, os.path.splitext(relative_path)[0] + AUDIO_FORMATS[audio_format]["ext"])
+
+
+def run_ffmpeg(input_args: list[str], output_path: str, audio_format: str, bitrate: str) -> None:
+    """Encode with ffmpeg, through a temporary file renamed once complete."""
+    fmt = AUDIO_FORMATS[audio_format]
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    tmp_path = f"{os.path.splitext(output_path)[0]}.tmp{fmt['ext']}"
+    subprocess.run(["ffmpeg", "-y", "-loglevel", "error", *input_args, "-ac", "1",
+                    *fmt["codec_args"], "-b:a", bitrate, tmp_path], check=True)
+    os.replace(tmp_path, output_path)
+
+
+def transcode(wav_path: str, output_path: str, audio_format: str, bitrate: str) -> None:
+    """Encode a WAV file."""
+    run_ffmpeg(["-i", wav_path], output_path, audio_format, bitrate)
+
+
+def build_sprite(wav_paths: list[str], output_path: str, audio_format: str, bitrate: str) -> None:
+    """Concatenate WAV files, back to back, into a single compressed file."""
+    input_args = [arg for wav_path in wav_paths for arg in ("-i", wav_path)]
+    streams = "".join(f"[{idx}:a]" for idx in range(len(wav_paths)))
+    run_ffmpeg([*input_args, "-filter_complex", f"{streams}concat=n={len(wav_paths)}:v=0:a=1[out]",
+                "-map", "[out]"], output_path, audio_format, bitrate)
+
+
+def export_audio(tts_dir: str, export_dir: str, formats: list[str], bitrates: dict[str, str],
+                 workers: int) -> dict[str, dict]:
+    """Transcode the changed files of tts_dir into export_dir, in parallel.
+
+    Return the export manifest: relative WAV path -> content hash, encoding
+    settings and compressed files. Compressed files of deleted WAVs are removed.
+    """
+    manifest_path = os.path.join(export_dir, MANIFEST_FILE)
+    previous: dict[str, dict] = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+
+    wav_paths = find_wav_files(tts_dir)
+    with ThreadPoolExecutor(workers) as pool:
+        hashes = list(pool.map(file_sha256, wav_paths))
+
+    manifest: dict[str, dict] = {}
+    tasks: list[tuple[str, str, str, str]] = []
+    for wav_path, sha in zip(wav_paths, hashes):
+        relative_path = os.path.relpath(wav_path, tts_dir)
+        settings = {audio_format: bitrates[audio_format] for audio_format in formats}
+        outputs = {audio_format: os.path.relpath(compressed_path(wav_path, tts_dir, export_dir, audio_format),
+                                                 export_dir)
+                   for audio_format in formats}
+        manifest[relative_path] = {"sha256": sha, "settings": settings, "outputs": outputs}
+
+        entry = previous.get(relative_path, {})
+        for audio_format in formats:
+            output_path = os.path.join(export_dir, outputs[audio_format])
+            unchanged = (entry.get("sha256") == sha
+                         and entry.get("settings", {}).get(audio_format) == bitrates[audio_format]
+                         and os.path.exists(output_path))
+            if not unchanged:
+                tasks.append((wav_path, output_path, audio_format, bitrates[audio_format]))
+
+    print(f"{len(wav_paths)} files, {len(tasks)} encodings to run")
+    with ThreadPoolExecutor(workers) as pool:  # Threads only wait on ffmpeg processes
+        futures = [pool.submit(transcode, *task) for task in tasks]
+        for current, (future, task) in enumerate(zip(futures, tasks), start=1):
+            future.result()
+            print(f"[{current}/{len(tasks)}] {task[1]}")
+
+    # Compressed files of WAVs that were deleted (e.g. lines pruned by generate_tts.py)
+    kept = {output for entry in manifest.values() for output in entry["outputs"].values()}
+    removed = [output for entry in previous.values() for output in entry.get("outputs", {}).values()
+               if output not in kept and os.path.exists(os.path.join(export_dir, output))]
+    for output in removed:
+        os.remove(os.path.join(export_dir, output))
+    if removed:
+        print(f"Removed {len(removed)} compressed files of deleted WAVs")
+
+    os.makedirs(export_dir, exist_ok=True)
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tts-dir", default=TTS_OUTPUT_DIR)
+    parser.add_argument("--export-dir", default=EXPORT_DIR)
+    parser.add_argument("--formats", default=",".join(AUDIO_FORMATS),
+                        help=f"Comma-separated subset of: {', '.join(AUDIO_FORMATS)}")
+    for audio_format, fmt in AUDIO_FORMATS.items():
+        parser.add_argument(f"--{audio_format}-bitrate", default=fmt["bitrate"])
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    formats = args.formats.split(",")
+    for audio_format in formats:
+        if audio_format not in AUDIO_FORMATS:
+            parser.error(f"Unknown format: {audio_format}")
+    bitrates = {audio_format: getattr(args, f"{audio_format}_bitrate") for audio_format in formats}
+
+    export_audio(args.tts_dir, args.export_dir, formats, bitrates, args.workers)
+    print(f"Done! Compressed audio in {args.export_dir}/")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,453 @@
 #!/usr/bin/env python3
 """Generate a mobile-friendly rehearsal webpage from drama data."""
 
+import argparse
+import hashlib
 import json
-from drama import Drama
+import os
+from concurrent.futures import ThreadPoolExecutor
+from drama import Drama, normalize_character
+from drama_pack import open_drama
+from export_audio import AUDIO_FORMATS, EXPORT_DIR, MANIFEST_FILE, build_sprite, file_sha256
+from generate_tts import load_journal, load_manifest
+from line_manifest import line_audio_path, load_line_manifest
+from wav_files import read_wav_header
 
 DRAMA_FILE = "full_drama.txt"
 TTS_OUTPUT_DIR = "tts-output"
 OUTPUT_HTML = "index.html"
-
-
-def generate_drama_data(drama: Drama, tts_dir: str) -> dict:
-    """Convert drama to JSON-serializable structure with audio paths."""
+SPRITE_DIR = f"{EXPORT_DIR}/sprites"
+SCENE_DIR = "scenes"
+SERVICE_WORKER_FILE = "sw.js"
+PRECACHE_MANIFEST_FILE = "precache-manifest.json"
+
+
+def load_export_manifest(export_dir: str) -> tuple[list[str], dict[str, dict]]:
+    """Load the manifest written by export_audio.py.
+
+    Return the formats available for every exported file, and the manifest entries.
+    """
+    manifest_path = os.path.join(export_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return [], {}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    formats = [audio_format for audio_format in AUDIO_FORMATS
+               if manifest and all(audio_format in entry["outputs"] for entry in manifest.values())]
+    return formats, manifest
+
+
+def generate_drama_data(drama: Drama, tts_dir: str, export_dir: str | None = None) -> dict:
+    """Convert drama to JSON-serializable structure with audio paths.
+
+    Audio paths are resolved by dialogue ID through the line manifest written by
+    generate_tts.py. Trees without one use the act<N>/scene<N>/NNN_<character>.wav layout.
+
+    If export_dir contains compressed audio, each dialogue also gets the URLs
+    of its compressed versions in "sources", matching the MIME types of "audio_types".
+    The WAV in "audio" stays as the last fallback.
+
+    Each scene and act also gets "character_lines": character ID -> sorted indices
+    of its lines, within the scene or across the scenes of the act, and
+    "first_line": the index of its first line in the whole play.
+    """
+    formats, export_manifest = load_export_manifest(export_dir) if export_dir else ([], {})
+    line_manifest = load_line_manifest(tts_dir)
     characters = set()
     acts_data = []
+    play_line_idx = 0
 
     for act_idx, act in enumerate(drama.acts, start=1):
         scenes_data = []
+        act_lines: dict[str, list[int]] = {}
+        act_first_line = play_line_idx
         for scene_idx, scene in enumerate(act.scenes, start=1):
             dialogues_data = []
-            for line_idx, (character, text) in enumerate(scene.dialogues, start=1):
-                characters.add(character.lower())
-                audio_path = f"{tts_dir}/act{act_idx}/scene{scene_idx}/{line_idx:03d}_{character}.wav"
-                dialogues_data.append({
+            scene_first_line = play_line_idx
+            scene_lines: dict[str, list[int]] = {}
+            for position, (line_idx, dialogue_id, dialogue) in enumerate(
+                    zip(scene.numbers, scene.ids, scene.dialogues)):
+                character = dialogue.character.name
+                char_id = dialogue.character.key
+                characters.add(char_id)
+                scene_lines.setdefault(char_id, []).append(position)
+                act_lines.setdefault(char_id, []).append(play_line_idx - act_first_line)
+                play_line_idx += 1
+                if line_manifest:
+                    entry = line_manifest.get(dialogue_id)
+                    relative_path = entry["audio"] if entry else line_audio_path(dialogue_id)
+                else:
+                    relative_path = f"act{act_idx}/scene{scene_idx}/{line_idx:03d}_{character}.wav"
+                dialogue_data = {
                     "character": character,
-                    "text": text,
-                    "audio": audio_path
-                })
-            scenes_data.append({"dialogues": dialogues_data})
-        acts_data.append({"scenes": scenes_data})
+                    "character_id": char_id,
+                    "text": dialogue.text,
+                    "audio": f"{tts_dir}/{relative_path}"
+                }
+                if relative_path in export_manifest:
+                    outputs = export_manifest[relative_path]["outputs"]
+                    dialogue_data["sources"] = [f"{export_dir}/{outputs[audio_format]}"
+                                                for audio_format in formats]
+                dialogues_data.append(dialogue_data)
+            scenes_data.append({"dialogues": dialogues_data, "character_lines": scene_lines,
+                                "first_line": scene_first_line})
+        acts_data.append({"scenes": scenes_data, "character_lines": act_lines, "first_line": act_first_line})
 
     return {
         "title": drama.title,
         "characters": sorted(characters),
+        "audio_types": [AUDIO_FORMATS[audio_format]["type"] for audio_format in formats],
+        "line_count": play_line_idx,
         "acts": acts_data
     }
 
 
+def add_scene_sprites(drama_data: dict, sprite_dir: str, workers: int | None = None) -> None:
+    """Concatenate the audio of each scene into one compressed sprite per format.
+
+    Each scene gets the URLs of its sprites in "sprite" (matching the MIME types
+    of "sprite_types"), and each dialogue with audio gets its "start" and "end"
+    offsets in seconds. Sprites whose input files did not change are not rebuilt,
+    and sprites of scenes that no longer exist are removed.
+    """
+    formats = list(AUDIO_FORMATS)
+    manifest_path = os.path.join(sprite_dir, MANIFEST_FILE)
+    previous: dict[str, str] = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+
+    known_hashes = known_audio_hashes(os.curdir)
+    manifest: dict[str, str] = {}
+    tasks: list[tuple[list[str], str, str, str]] = []
+    for act_idx, act in enumerate(drama_data["acts"], start=1):
+        for scene_idx, scene in enumerate(act["scenes"], start=1):
+            wav_paths: list[str] = []
+            offset = 0.0
+            for dialogue in scene["dialogues"]:
+                header = read_wav_header(dialogue["audio"])
+                if header is None:
+                    continue  # Missing audio, the page falls back to the line's own file
+                sample_rate, frames = header
+                dialogue["start"] = round(offset, 4)
+                offset += frames / sample_rate
+                dialogue["end"] = round(offset, 4)
+                wav_paths.append(dialogue["audio"])
+            if not wav_paths:
+                continue
+
+            name = f"act{act_idx}_scene{scene_idx}"
+            scene["sprite"] = [f"{sprite_dir}/{name}{AUDIO_FORMATS[audio_format]['ext']}"
+                               for audio_format in formats]
+
+            # The sprite depends on the content and order of its files, and on the bitrates
+            sha = hashlib.sha256()
+            for wav_path in wav_paths:
+                sha.update((known_hashes.get(wav_path) or file_sha256(wav_path)).encode())
+            for audio_format in formats:
+                sha.update(AUDIO_FORMATS[audio_format]["bitrate"].encode())
+            manifest[name] = sha.hexdigest()
+
+            for audio_format, sprite_path in zip(formats, scene["sprite"]):
+                if previous.get(name) != manifest[name] or not os.path.exists(sprite_path):
+                    tasks.append((wav_paths, sprite_path, audio_format, AUDIO_FORMATS[audio_format]["bitrate"]))
+
+    print(f"Building {len(tasks)} sprites...")
+    with ThreadPoolExecutor(workers) as pool:
+        for _ in pool.map(lambda task: build_sprite(*task), tasks):
+            pass
+
+    # Sprites of scenes that no longer exist
+    for name in previous.keys() - manifest.keys():
+        for fmt in AUDIO_FORMATS.values():
+            sprite_path = os.path.join(sprite_dir, f"{name}{fmt['ext']}")
+            if os.path.exists(sprite_path):
+                os.remove(sprite_path)
+
+    os.makedirs(sprite_dir, exist_ok=True)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    drama_data["sprite_types"] = [AUDIO_FORMATS[audio_format]["type"] for audio_format in formats]
+
+
+def _prefixed_column(values: list[str | None]) -> dict:
+    """Factor out the common prefix of a column of URLs."""
+    present = [value for value in values if value is not None]
+    prefix = os.path.commonprefix(present) if present else ""
+    return {"prefix": prefix, "values": [value[len(prefix):] if value is not None else None for value in values]}
+
+
+def compact_drama_data(drama_data: dict) -> dict:
+    """Columnar copy of the drama data, for a smaller page.
+
+    The dialogues of each scene become "columns": one array per field, with the
+    character as an index into "character_names" and the common prefix of the
+    audio URLs factored out. The page expands a scene back when it is shown.
+    """
+    names: dict[str, int] = {}
+    acts = []
+    for act in drama_data["acts"]:
+        scenes = []
+        for scene in act["scenes"]:
+            dialogues = scene["dialogues"]
+            columns: dict = {
+                "count": len(dialogues),
+                "character": [names.setdefault(dialogue["character"], len(names)) for dialogue in dialogues],
+                "text": [dialogue["text"] for dialogue in dialogues],
+                "audio": _prefixed_column([dialogue["audio"] for dialogue in dialogues]),
+            }
+            if any("sources" in dialogue for dialogue in dialogues):
+                columns["sources"] = [
+                    _prefixed_column([dialogue["sources"][idx] if "sources" in dialogue else None
+                                      for dialogue in dialogues])
+                    for idx in range(len(drama_data["audio_types"]))]
+            if any("start" in dialogue for dialogue in dialogues):
+                columns["start"] = [dialogue.get("start") for dialogue in dialogues]
+                columns["end"] = [dialogue.get("end") for dialogue in dialogues]
+            scenes.append({**{key: value for key, value in scene.items() if key != "dialogues"},
+                           "columns": columns})
+        acts.append({**act, "scenes": scenes})
+
+    return {**drama_data, "acts": acts, "character_names": list(names),
+            "character_ids": [normalize_character(name) for name in names]}
+
+
+def scene_line_count(scene: dict) -> int:
+    """Number of dialogues of a scene, verbose or columnar."""
+    return scene["columns"]["count"] if "columns" in scene else len(scene["dialogues"])
+
+
+def split_scene_chunks(drama_data: dict, scene_dir: str) -> dict:
+    """Write the content of each scene to its own JSON file, named after its hash.
+
+    Return the index to inline in the page: the drama data where each act only
+    keeps its scenes, and each scene the URL of its file, its number of lines,
+    its first line and the number of lines of each character. Files of previous
+    builds are removed.
+    """
+    os.makedirs(scene_dir, exist_ok=True)
+    written: set[str] = set()
+    acts_index = []
+    for act_idx, act in enumerate(drama_data["acts"], start=1):
+        scenes_index = []
+        for scene_idx, scene in enumerate(act["scenes"], start=1):
+            content = json.dumps(scene, ensure_ascii=False, separators=(",", ":"))
+            sha = hashlib.sha256(content.encode("utf-8")).hexdigest()[:12]
+            filename = f"act{act_idx}_scene{scene_idx}.{sha}.json"
+            with open(os.path.join(scene_dir, filename), "w", encoding="utf-8") as f:
+                f.write(content)
+            written.add(filename)
+
+            counts = {char_id: len(lines) for char_id, lines in scene["character_lines"].items()}
+            scenes_index.append({"url": f"{scene_dir}/{filename}", "lines": scene_line_count(scene),
+                                 "first_line": scene["first_line"], "counts": counts})
+        acts_index.append({"scenes": scenes_index})  # Act character_lines would dwarf the index
+
+    for filename in os.listdir(scene_dir):
+        if filename.endswith(".json") and filename not in written:
+            os.remove(os.path.join(scene_dir, filename))
+    return {**drama_data, "acts": acts_index}
+
+
+def collect_audio_urls(drama_data: dict) -> list[str]:
+    """Every audio URL the page may request: WAV, compressed versions and sprites."""
+    urls: dict[str, None] = {}
+    for act in drama_data["acts"]:
+        for scene in act["scenes"]:
+            for url in scene.get("sprite", []):
+                urls[url] = None
+            for dialogue in scene["dialogues"]:
+                for url in [dialogue["audio"], *dialogue.get("sources", [])]:
+                    urls[url] = None
+    return list(urls)
+
+
+def _short_hash(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def known_audio_hashes(output_dir: str, tts_dir: str = TTS_OUTPUT_DIR, export_dir: str = EXPORT_DIR,
+                       sprite_dir: str = SPRITE_DIR) -> dict[str, str]:
+    """Content hashes of audio URLs, taken from the manifests of the stages that wrote them.
+
+    Lines of generate_tts.py are identified by their cache key and their length
+    in the journal (re-trimming keeps the key), compressed files by the hash of
+    their WAV in the export manifest and their encoding, and sprites by the
+    hash of their inputs.
+    """
+    hashes: dict[str, str] = {}
+    tts_path = os.path.join(output_dir, tts_dir)
+    journal = load_journal(os.path.join(tts_path, "journal.jsonl"))
+    for key, outputs in load_manifest(os.path.join(tts_path, "manifest.json")).items():
+        if key in journal:
+            for output in outputs:
+                hashes[f"{tts_dir}/{output}"] = _short_hash(key, journal[key]["frames"])
+
+    _, export_manifest = load_export_manifest(os.path.join(output_dir, export_dir))
+    for entry in export_manifest.values():
+        for audio_format, output in entry["outputs"].items():
+            hashes[f"{export_dir}/{output}"] = _short_hash(entry["sha256"], audio_format,
+                                                           entry["settings"].get(audio_format))
+
+    sprite_manifest_path = os.path.join(output_dir, sprite_dir, MANIFEST_FILE)
+    if os.path.exists(sprite_manifest_path):
+        with open(sprite_manifest_path, "r", encoding="utf-8") as f:
+            for name, sha in json.load(f).items():
+                for audio_format, fmt in AUDIO_FORMATS.items():
+                    hashes[f"{sprite_dir}/{name}{fmt['ext']}"] = _short_hash(sha, audio_format)
+    return hashes
+
+
+def write_offline_files(drama_data: dict, html: str, output_dir: str, extra_urls: list[str] | None = None,
+                        workers: int | None = None) -> str:
+    """Write the precache manifest and the service worker next to the page.
+
+    The manifest maps each existing audio URL, and extra_urls, to a hash of its content. The
+    service worker keys its cached copies by this hash, so that a rebuild only
+    invalidates the files whose content changed. Hashes recorded by the audio
+    stages are reused (see known_audio_hashes()): only the other files are read.
+    Return the version, which changes whenever the page or any audio file changes.
+    """
+    urls = [url for url in collect_audio_urls(drama_data) + (extra_urls or [])
+            if os.path.exists(os.path.join(output_dir, url))]
+    known = known_audio_hashes(output_dir)
+    unknown = [url for url in urls if url not in known]
+    with ThreadPoolExecutor(workers) as pool:
+        hashes = dict(zip(unknown, pool.map(lambda url: file_sha256(os.path.join(output_dir, url))[:16], unknown)))
+    assets = {url: known.get(url) or hashes[url] for url in urls}
+
+    sha = hashlib.sha256(html.encode("utf-8"))
+    sha.update(json.dumps(assets, sort_keys=True).encode("utf-8"))
+    version = sha.hexdigest()[:16]
+
+    with open(os.path.join(output_dir, PRECACHE_MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump({"version": version, "assets": assets}, f, indent=1, sort_keys=True, ensure_ascii=False)
+    with open(os.path.join(output_dir, SERVICE_WORKER_FILE), "w", encoding="utf-8") as f:
+        f.write(SERVICE_WORKER_TEMPLATE.replace("__VERSION__", version)
+                .replace("__MANIFEST_URL__", PRECACHE_MANIFEST_FILE))
+    return version
+
+
+def render_html(page_data: dict) -> str:
+    """The rehearsal page, with the drama data inlined."""
+    return (HTML_TEMPLATE.replace("__SERVICE_WORKER__", SERVICE_WORKER_FILE)
+            .replace("__PRECACHE_MANIFEST__", PRECACHE_MANIFEST_FILE)
+            .replace("__DRAMA_DATA__", json.dumps(page_data, ensure_ascii=False)))
+
+
+SERVICE_WORKER_TEMPLATE = '''// Generated by generate_rehearsal.py
+const VERSION = "__VERSION__";
+const SHELL_CACHE = `prettydrama-shell-${VERSION}`;
+const AUDIO_CACHE = "prettydrama-audio";  // Kept across versions, entries are keyed by content hash
+const MANIFEST_URL = "__MANIFEST_URL__";
+
+let manifestPromise = null;
+
+function getManifest() {
+    if (!manifestPromise) {
+        manifestPromise = caches.open(SHELL_CACHE)
+            .then(cache => cache.match(MANIFEST_URL))
+            .then(response => response || fetch(MANIFEST_URL))
+            .then(response => response.json());
+        manifestPromise.catch(() => { manifestPromise = null; });
+    }
+    return manifestPromise;
+}
+
+// URL relative to the page, as written in the precache manifest
+function assetPath(url) {
+    const scope = self.registration.scope;
+    if (!url.startsWith(scope)) return null;
+    return decodeURIComponent(url.slice(scope.length).split(/[?#]/)[0]);
+}
+
+function cacheKey(path, hash) {
+    return new URL(`${path}?v=${hash}`, self.registration.scope).href;
+}
+
+// <audio> elements ask for byte ranges, which Safari requires to be answered with a 206
+async function rangeResponse(response, range) {
+    const match = /^bytes=(\\d*)-(\\d*)$/.exec(range);
+    const data = await response.arrayBuffer();
+    if (!match) return new Response(data, { headers: response.headers });
+    let start = match[1] === "" ? data.byteLength - Number(match[2]) : Number(match[1]);
+    let end = match[1] !== "" && match[2] !== "" ? Number(match[2]) : data.byteLength - 1;
+    start = Math.max(0, start);
+    end = Math.min(end, data.byteLength - 1);
+    return new Response(data.slice(start, end + 1), {
+        status: 206,
+        headers: {
+            "Content-Type": response.headers.get("Content-Type") || "application/octet-stream",
+            "Content-Range": `bytes ${start}-${end}/${data.byteLength}`,
+            "Content-Length": String(end - start + 1),
+        },
+    });
+}
+
+self.addEventListener("install", event => {
+    event.waitUntil(caches.open(SHELL_CACHE)
+        .then(cache => cache.addAll(["./", MANIFEST_URL].map(url => new Request(url, { cache: "reload" }))))
+        .then(() => self.skipWaiting()));
+});
+
+self.addEventListener("activate", event => {
+    event.waitUntil((async () => {
+        for (const name of await caches.keys()) {
+            if (name.startsWith("prettydrama-shell-") && name !== SHELL_CACHE) await caches.delete(name);
+        }
+        // Only drop the audio whose content changed or that no longer exists
+        const manifest = await getManifest();
+        const cache = await caches.open(AUDIO_CACHE);
+        for (const request of await cache.keys()) {
+            const path = assetPath(request.url);
+            const hash = new URL(request.url).searchParams.get("v");
+            if (!path || manifest.assets[path] !== hash) await cache.delete(request);
+        }
+        await self.clients.claim();
+    })());
+});
+
+self.addEventListener("fetch", event => {
+    const request = event.request;
+    if (request.method !== "GET" || !request.url.startsWith(self.registration.scope)) return;
+
+    if (request.mode === "navigate") {
+        // Network first, so that a rebuilt page shows up as soon as it is online
+        event.respondWith(fetch(request)
+            .then(response => {
+                const copy = response.clone();
+                if (response.ok) caches.open(SHELL_CACHE).then(cache => cache.put("./", copy));
+                return response;
+            })
+            .catch(() => caches.match("./", { cacheName: SHELL_CACHE })));
+        return;
+    }
+
+    event.respondWith((async () => {
+        let manifest;
+        try {
+            manifest = await getManifest();
+        } catch (e) {
+            return fetch(request);
+        }
+        const path = assetPath(request.url);
+        const hash = path && manifest.assets[path];
+        if (!hash) return fetch(request);
+
+        const cache = await caches.open(AUDIO_CACHE);
+        const key = cacheKey(path, hash);
+        const cached = await cache.match(key);
+        const range = request.headers.get("range");
+        if (cached) return range ? rangeResponse(cached, range) : cached;
+
+        const response = await fetch(request);
+        if (!range && response.status === 200) cache.put(key, response.clone());
+        return response;
+    })());
+});
+'''
+
+
 HTML_TEMPLATE = '''<!DOCTYPE html>
 <html lang="fr">
 <head>
@@ -124,7 +536,7 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
         }
 
         header.expanded .header-content {
-            max-height: 200px;
+            max-height: 260px;
             padding: 0 16px 12px;
         }
 
@@ -231,6 +643,39 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
             color: var(--text-medium);
         }
 
+        .offline-section {
+            display: none;
+            margin-top: 8px;
+        }
+
+        .offline-section.available {
+            display: flex;
+        }
+
+        .offline-btn {
+            padding: 7px 12px;
+            border-radius: 8px;
+            border: 1px solid var(--accent-light);
+            background: var(--bg-card);
+            color: var(--accent-dark);
+            font-family: 'Inter', sans-serif;
+            font-size: 0.8rem;
+            font-weight: 600;
+            cursor: pointer;
+            white-space: nowrap;
+        }
+
+        .offline-btn:disabled {
+            opacity: 0.5;
+            cursor: default;
+        }
+
+        .offline-status {
+            font-size: 0.75rem;
+            color: var(--text-medium);
+            white-space: nowrap;
+        }
+
         .dialogue-card.muted.hide-text .dialogue-text {
             filter: blur(8px);
             user-select: none;
@@ -546,6 +991,14 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
                 <div class="select-wrapper">
                     <select id="scene-select"></select>
                 </div>
+                <div class="select-wrapper">
+                    <select id="playlist-select">
+                        <option value="scene">Scène seule</option>
+                        <option value="act">Acte entier</option>
+                        <option value="play">Pièce entière</option>
+                        <option value="character">Mes scènes</option>
+                    </select>
+                </div>
             </div>
             <div class="rehearse-section">
                 <label>Je joue</label>
@@ -563,6 +1016,18 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
                     <span>Bip</span>
                 </label>
             </div>
+            <div class="rehearse-section offline-section" id="offline-section">
+                <label>Hors ligne</label>
+                <div class="select-wrapper">
+                    <select id="offline-select">
+                        <option value="scene">Cette scène</option>
+                        <option value="act">Cet acte</option>
+                        <option value="character">Mes scènes</option>
+                    </select>
+                </div>
+                <button class="offline-btn" id="offline-btn">Télécharger</button>
+                <span class="offline-status" id="offline-status"></span>
+            </div>
         </div>
     </header>
 
@@ -620,6 +1085,7 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
         const hideTextCheckbox = document.getElementById("hide-text-checkbox");
         const beepCheckbox = document.getElementById("beep-checkbox");
         const sceneSelect = document.getElementById("scene-select");
+        const playlistSelect = document.getElementById("playlist-select");
         const characterSelect = document.getElementById("character-select");
         const dialogueContainer = document.getElementById("dialogue-container");
         const audioPlayer = document.getElementById("audio-player");
@@ -631,6 +1097,23 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
         const waitIndicator = document.getElementById("wait-indicator");
         const prevMyLineBtn = document.getElementById("prev-my-line-btn");
         const nextMyLineBtn = document.getElementById("next-my-line-btn");
+        const offlineSection = document.getElementById("offline-section");
+        const offlineSelect = document.getElementById("offline-select");
+        const offlineBtn = document.getElementById("offline-btn");
+        const offlineStatus = document.getElementById("offline-status");
+
+        // First compressed format this browser can play, -1 to play the WAV files
+        const audioFormatIndex = DRAMA_DATA.audio_types.findIndex(type => audioPlayer.canPlayType(type) !== "");
+
+        function getAudioUrl(dialogue) {
+            if (audioFormatIndex >= 0 && dialogue.sources) return dialogue.sources[audioFormatIndex];
+            return dialogue.audio;
+        }
+
+        // Scene sprites: one file per scene, each line is played between its start and end offsets
+        const spriteFormatIndex = (DRAMA_DATA.sprite_types || []).findIndex(type => audioPlayer.canPlayType(type) !== "");
+        let spriteEnd = null;
+        let spriteSegment = 0;
 
         function init() {
             // Set title
@@ -664,14 +1147,14 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
                 currentSceneIndex = 0;
                 currentDialogueIndex = 0;
                 updateSceneSelect();
-                renderScene();
+                showScene();
                 stop();
             });
 
             sceneSelect.addEventListener("change", () => {
                 currentSceneIndex = parseInt(sceneSelect.value);
                 currentDialogueIndex = 0;
-                renderScene();
+                showScene();
                 stop();
             });
 
@@ -680,12 +1163,17 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
                 prevMyLineBtn.classList.toggle("visible", rehearseCharacter !== "");
                 nextMyLineBtn.classList.toggle("visible", rehearseCharacter !== "");
                 updateSceneSelect();
-                renderScene();
+                refreshCards();
+            });
+
+            playlistSelect.addEventListener("change", () => {
+                prefetchNextScene();
+                updateStatus();
             });
 
             hideTextCheckbox.addEventListener("change", () => {
                 hideRehearsalText = hideTextCheckbox.checked;
-                renderScene();
+                refreshCards();
             });
 
             beepCheckbox.addEventListener("change", () => {
@@ -695,6 +1183,17 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
                 }
             });
 
+            // A single handler for every card, rendered or not yet
+            dialogueContainer.addEventListener("click", (e) => {
+                const card = e.target.closest(".dialogue-card");
+                if (!card) return;
+                currentDialogueIndex = parseInt(card.dataset.index);
+                highlightCurrent();
+                if (isPlaying) playCurrentDialogue();
+            });
+            window.addEventListener("scroll", scheduleRenderWindow, { passive: true });
+            window.addEventListener("resize", scheduleRenderWindow);
+
             playBtn.addEventListener("click", togglePlay);
             prevBtn.addEventListener("click", prevDialogue);
             nextBtn.addEventListener("click", nextDialogue);
@@ -709,10 +1208,12 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
 
             const startDrag = (e) => {
                 e.preventDefault();
+                if (!getCurrentScene().dialogues) return;
                 isDragging = true;
                 wasPlayingBeforeDrag = isPlaying;
                 if (isPlaying) {
                     audioPlayer.pause();
+                    stopGapless();
                 }
                 progressContainer.classList.add("dragging");
                 updateSeekPosition(e);
@@ -763,8 +1264,27 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
             audioPlayer.addEventListener("ended", onAudioEnded);
             audioPlayer.addEventListener("timeupdate", updateProgress);
 
+            setupOffline();
             updateSceneSelect();
-            renderScene();
+            showScene();
+        }
+
+        function getCharacterLineCount(scene, character) {
+            // Scenes loaded on demand come with their counts, before their lines
+            if (scene.counts) return scene.counts[character] || 0;
+            return (scene.character_lines[character] || []).length;
+        }
+
+        function lowerBound(sorted, value) {
+            // Index of the first element >= value
+            let lo = 0;
+            let hi = sorted.length;
+            while (lo < hi) {
+                const mid = (lo + hi) >> 1;
+                if (sorted[mid] < value) lo = mid + 1;
+                else hi = mid;
+            }
+            return lo;
         }
 
         function updateSceneSelect() {
@@ -775,9 +1295,7 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
                 opt.value = i;
                 let label = `Scène ${i + 1}`;
                 if (rehearseCharacter) {
-                    const count = scene.dialogues.filter(d =>
-                        d.character.toLowerCase() === rehearseCharacter.toLowerCase()
-                    ).length;
+                    const count = getCharacterLineCount(scene, rehearseCharacter);
                     if (count > 0) label += ` (${count} réplique${count > 1 ? 's' : ''})`;
                 }
                 opt.textContent = label;
@@ -790,90 +1308,311 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
             return DRAMA_DATA.acts[currentActIndex].scenes[currentSceneIndex];
         }
 
-        function renderScene() {
-            const scene = getCurrentScene();
-            dialogueContainer.innerHTML = "";
-
-            // Count user's lines for numbering
-            const userLineIndices = [];
-            scene.dialogues.forEach((d, i) => {
-                if (d.character.toLowerCase() === rehearseCharacter.toLowerCase()) {
-                    userLineIndices.push(i);
+        // Split builds only inline an index: the dialogues of each scene are in their own
+        // JSON file, fetched when the scene is shown.
+        const sceneLoads = new Map();  // url -> Promise
+        let sceneToken = 0;
+
+        // Compact builds ship the dialogues of each scene as columns, expanded when needed
+        function expandScene(scene) {
+            const columns = scene.columns;
+            if (!columns) return scene;
+            const expand = column => column.values.map(value => value === null ? null : column.prefix + value);
+            const audio = expand(columns.audio);
+            const sources = (columns.sources || []).map(expand);
+            scene.dialogues = columns.character.map((index, i) => {
+                const dialogue = {
+                    character: DRAMA_DATA.character_names[index],
+                    character_id: DRAMA_DATA.character_ids[index],
+                    text: columns.text[i],
+                    audio: audio[i],
+                };
+                if (sources.length && sources[0][i] !== null) dialogue.sources = sources.map(urls => urls[i]);
+                if (columns.start && columns.start[i] !== null) {
+                    dialogue.start = columns.start[i];
+                    dialogue.end = columns.end[i];
                 }
+                return dialogue;
             });
+            delete scene.columns;
+            return scene;
+        }
+
+        function loadScene(scene) {
+            expandScene(scene);
+            if (scene.dialogues) return Promise.resolve(scene);
+            let promise = sceneLoads.get(scene.url);
+            if (!promise) {
+                promise = fetch(scene.url)
+                    .then(response => {
+                        if (!response.ok) throw new Error(`${response.status} ${scene.url}`);
+                        return response.json();
+                    })
+                    .then(data => expandScene(Object.assign(scene, data)));
+                promise.catch(() => sceneLoads.delete(scene.url));
+                sceneLoads.set(scene.url, promise);
+            }
+            return promise;
+        }
 
-            let userLineNumber = 0;
-            scene.dialogues.forEach((d, i) => {
-                const card = document.createElement("div");
-                card.className = "dialogue-card";
-                card.dataset.index = i;
-
-                const isMuted = d.character.toLowerCase() === rehearseCharacter.toLowerCase();
-                if (isMuted) {
-                    userLineNumber++;
-                    card.classList.add("muted");
-                    if (hideRehearsalText) card.classList.add("hide-text");
-                }
+        // Continuous playback: at the end of a scene, playback goes on with the next scene of
+        // the playlist (the act, the play, or the scenes of the rehearsed character).
+        const ALL_SCENES = DRAMA_DATA.acts.flatMap((act, actIndex) =>
+            act.scenes.map((scene, sceneIndex) => ({ actIndex, sceneIndex, scene })));
+        const scenePositions = new Map(ALL_SCENES.map((entry, position) => [entry.scene, position]));
+
+        function isContinuous() {
+            return playlistSelect.value !== "scene";
+        }
 
-                const charEl = document.createElement("div");
-                charEl.className = "character-name";
-                charEl.textContent = isMuted ? `${d.character} (${userLineNumber}/${userLineIndices.length})` : d.character;
+        function getNextPlaylistEntry(scene) {
+            const position = scenePositions.get(scene);
+            for (let i = position + 1; i < ALL_SCENES.length; i++) {
+                const entry = ALL_SCENES[i];
+                if (playlistSelect.value === "act" && entry.actIndex !== ALL_SCENES[position].actIndex) return null;
+                if (playlistSelect.value === "character" && rehearseCharacter
+                    && getCharacterLineCount(entry.scene, rehearseCharacter) === 0) continue;
+                return entry;
+            }
+            return null;
+        }
+
+        function prefetchNextScene() {
+            const entry = getNextPlaylistEntry(getCurrentScene());
+            if (entry) loadScene(entry.scene).catch(() => {});
+        }
 
-                const textEl = document.createElement("div");
-                textEl.className = "dialogue-text";
-                textEl.textContent = d.text;
+        function showScene() {
+            const token = ++sceneToken;
+            const scene = expandScene(getCurrentScene());
+            renderScene();  // Empty until the scene is loaded
+            if (scene.dialogues) {
+                prefetchNextScene();
+                return Promise.resolve();
+            }
+            return loadScene(scene).then(() => {
+                if (token !== sceneToken) return;
+                renderScene();
+                prefetchNextScene();
+            }).catch(e => {
+                console.error("Scene load error:", e);
+                if (token === sceneToken) statusBar.textContent = "Scène indisponible";
+            });
+        }
 
-                card.appendChild(charEl);
-                card.appendChild(textEl);
-                dialogueContainer.appendChild(card);
+        function showSceneAt(entry, dialogueIndex) {
+            // Resolves to whether the scene is still the current one, with its dialogues
+            currentActIndex = entry.actIndex;
+            currentSceneIndex = entry.sceneIndex;
+            currentDialogueIndex = dialogueIndex;
+            actSelect.value = currentActIndex;
+            updateSceneSelect();
+            return showScene().then(() => getCurrentScene() === entry.scene && !!entry.scene.dialogues);
+        }
 
-                card.addEventListener("click", () => {
-                    currentDialogueIndex = i;
-                    highlightCurrent();
-                    if (isPlaying) playCurrentDialogue();
-                });
+        function continueWithScene(entry) {
+            showSceneAt(entry, 0).then(shown => {
+                if (shown && isPlaying) playCurrentDialogue(true);
             });
+        }
+
+        // Virtualized list: only the cards around the viewport are in the DOM, between two
+        // spacers standing for the others. Row heights are estimated from the text length,
+        // then measured once their card is rendered.
+        const OVERSCAN_PX = 800;
+        const CARD_GAP = 12;  // .dialogue-card margin-bottom
+        const topSpacer = document.createElement("div");
+        const bottomSpacer = document.createElement("div");
+        let rowHeights = [];
+        let rowOffsets = [0];  // Top of each row, then the total height
+        let renderedCards = new Map();  // index -> card, for a contiguous range of rows
+        let activeCard = null;
+        let myLineNumbers = [];  // index -> number of the line among the rehearsed character's, 0 for others
+        let myLineCount = 0;
+        let windowFrame = 0;
+
+        function estimateRowHeight(text) {
+            const charsPerLine = Math.max(20, (dialogueContainer.clientWidth - 80) / 9);
+            return 62 + Math.ceil(text.length / charsPerLine) * 32 + CARD_GAP;
+        }
+
+        function updateOffsets(from) {
+            for (let i = from; i < rowHeights.length; i++) {
+                rowOffsets[i + 1] = rowOffsets[i] + rowHeights[i];
+            }
+        }
+
+        function findRow(y) {
+            // Last row starting above y
+            let lo = 0;
+            let hi = rowHeights.length - 1;
+            while (lo < hi) {
+                const mid = (lo + hi + 1) >> 1;
+                if (rowOffsets[mid] <= y) lo = mid;
+                else hi = mid - 1;
+            }
+            return lo;
+        }
+
+        function getRowsTop() {
+            // Page coordinate of the first row, below the container padding
+            return dialogueContainer.getBoundingClientRect().top + window.scrollY + 20;
+        }
+
+        function countMyLines(scene) {
+            const myLines = scene.character_lines[rehearseCharacter] || [];
+            myLineNumbers = new Array(scene.dialogues.length).fill(0);
+            myLines.forEach((index, k) => { myLineNumbers[index] = k + 1; });
+            myLineCount = myLines.length;
+        }
+
+        function renderScene() {
+            const scene = getCurrentScene();
+            dialogueContainer.innerHTML = "";
+            renderedCards = new Map();
+            activeCard = null;
+            rowHeights = [];
+            if (!scene.dialogues) {
+                updateStatus();
+                return;
+            }
+
+            countMyLines(scene);
+            rowHeights = scene.dialogues.map(d => estimateRowHeight(d.text));
+            rowOffsets = new Array(rowHeights.length + 1);
+            rowOffsets[0] = 0;
+            updateOffsets(0);
 
+            dialogueContainer.appendChild(topSpacer);
+            dialogueContainer.appendChild(bottomSpacer);
+            renderWindow();
             highlightCurrent();
             updateStatus();
         }
 
-        function highlightCurrent() {
-            document.querySelectorAll(".dialogue-card").forEach((card, i) => {
-                card.classList.toggle("active", i === currentDialogueIndex);
+        function fillCard(card, i) {
+            const d = getCurrentScene().dialogues[i];
+            const isMuted = myLineNumbers[i] > 0;
+            card.classList.toggle("muted", isMuted);
+            card.classList.toggle("hide-text", isMuted && hideRehearsalText);
+            card.classList.toggle("active", i === currentDialogueIndex);
+            card.firstChild.textContent = isMuted ? `${d.character} (${myLineNumbers[i]}/${myLineCount})` : d.character;
+        }
+
+        function createCard(i) {
+            const card = document.createElement("div");
+            card.className = "dialogue-card";
+            card.dataset.index = i;
+
+            const charEl = document.createElement("div");
+            charEl.className = "character-name";
+
+            const textEl = document.createElement("div");
+            textEl.className = "dialogue-text";
+            textEl.textContent = getCurrentScene().dialogues[i].text;
+
+            card.appendChild(charEl);
+            card.appendChild(textEl);
+            fillCard(card, i);
+            return card;
+        }
+
+        // Update the rendered cards in place, after a change of character or of text hiding
+        function refreshCards() {
+            const scene = getCurrentScene();
+            if (!scene.dialogues) return;
+            countMyLines(scene);
+            renderedCards.forEach((card, i) => fillCard(card, i));
+        }
+
+        function renderWindow() {
+            if (rowHeights.length === 0 || !topSpacer.parentNode) return;
+            const rowsTop = getRowsTop();
+            const start = findRow(Math.max(0, window.scrollY - rowsTop - OVERSCAN_PX));
+            const end = findRow(Math.max(0, window.scrollY + window.innerHeight - rowsTop + OVERSCAN_PX));
+
+            renderedCards.forEach((card, i) => {
+                if (i >= start && i <= end) return;
+                card.remove();
+                renderedCards.delete(i);
+                if (card === activeCard) activeCard = null;
+            });
+
+            // Insert the missing cards before the following one, so that they stay in order
+            let following = bottomSpacer;
+            for (let i = end; i >= start; i--) {
+                let card = renderedCards.get(i);
+                if (!card) {
+                    card = createCard(i);
+                    dialogueContainer.insertBefore(card, following);
+                    renderedCards.set(i, card);
+                    if (i === currentDialogueIndex) activeCard = card;
+                }
+                following = card;
+            }
+
+            let changedFrom = -1;
+            for (let i = start; i <= end; i++) {
+                const height = renderedCards.get(i).offsetHeight + CARD_GAP;
+                if (height !== rowHeights[i]) {
+                    rowHeights[i] = height;
+                    if (changedFrom < 0) changedFrom = i;
+                }
+            }
+            if (changedFrom >= 0) updateOffsets(changedFrom);
+
+            topSpacer.style.height = `${rowOffsets[start]}px`;
+            bottomSpacer.style.height = `${rowOffsets[rowHeights.length] - rowOffsets[end + 1]}px`;
+        }
+
+        function scheduleRenderWindow() {
+            if (windowFrame) return;
+            windowFrame = requestAnimationFrame(() => {
+                windowFrame = 0;
+                renderWindow();
             });
+        }
 
-            const activeCard = document.querySelector(".dialogue-card.active");
-            if (activeCard) {
-                activeCard.scrollIntoView({ behavior: "smooth", block: "center" });
+        function highlightCurrent() {
+            // Only the previous and the new active cards change, if they are rendered
+            if (activeCard) activeCard.classList.remove("active");
+            activeCard = renderedCards.get(currentDialogueIndex) || null;
+            if (activeCard) activeCard.classList.add("active");
+
+            if (currentDialogueIndex < rowHeights.length) {
+                const rowTop = getRowsTop() + rowOffsets[currentDialogueIndex];
+                const top = rowTop - (window.innerHeight - rowHeights[currentDialogueIndex]) / 2;
+                window.scrollTo({ top: Math.max(0, top), behavior: "smooth" });
             }
         }
 
         const playIconSvg = '<svg viewBox="0 0 24 24"><path d="M8 5v14l11-7z"/></svg>';
         const pauseIconSvg = '<svg viewBox="0 0 24 24"><path d="M6 19h4V5H6v14zm8-14v14h4V5h-4z"/></svg>';
 
-        function playBeep() {
+        function playBeep(when) {
             if (!beepEnabled || !audioContext) return;
+            const startTime = when !== undefined ? when : audioContext.currentTime;
             const oscillator = audioContext.createOscillator();
             const gainNode = audioContext.createGain();
             oscillator.connect(gainNode);
             gainNode.connect(audioContext.destination);
             oscillator.frequency.value = 880;
             oscillator.type = "sine";
-            gainNode.gain.setValueAtTime(0.3, audioContext.currentTime);
-            gainNode.gain.exponentialRampToValueAtTime(0.01, audioContext.currentTime + 0.2);
-            oscillator.start(audioContext.currentTime);
-            oscillator.stop(audioContext.currentTime + 0.2);
+            gainNode.gain.setValueAtTime(0.3, startTime);
+            gainNode.gain.exponentialRampToValueAtTime(0.01, startTime + 0.2);
+            oscillator.start(startTime);
+            oscillator.stop(startTime + 0.2);
         }
 
         function togglePlay() {
             if (isPlaying) {
                 stop();
-            } else {
+            } else if (getCurrentScene().dialogues) {
                 // Initialize audio context on first play (required for mobile)
-                if (!audioContext && beepEnabled) {
+                if (!audioContext && (beepEnabled || GAPLESS)) {
                     audioContext = new (window.AudioContext || window.webkitAudioContext)();
                 }
+                if (audioContext && audioContext.state === "suspended") audioContext.resume();
                 isPlaying = true;
                 playBtn.innerHTML = pauseIconSvg;
                 playCurrentDialogue();
@@ -882,6 +1621,9 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
 
         function stop() {
             isPlaying = false;
+            spriteSegment++;
+            spriteEnd = null;
+            stopGapless();
             audioPlayer.pause();
             audioPlayer.currentTime = 0;
             playBtn.innerHTML = playIconSvg;
@@ -889,16 +1631,23 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
             updateStatus();
         }
 
-        function playCurrentDialogue() {
+        function playCurrentDialogue(naturalAdvance = false) {
             const scene = getCurrentScene();
             const dialogue = scene.dialogues[currentDialogueIndex];
 
             highlightCurrent();
 
-            const isMuted = dialogue.character.toLowerCase() === rehearseCharacter.toLowerCase();
+            const isMuted = isMutedLine(dialogue);
 
             if (isMuted && hideRehearsalText) {
                 // Show wait indicator and wait for user to tap next or timeout
+                if (spriteEnd !== null) {
+                    // Don't let the sprite run into the following lines
+                    audioPlayer.pause();
+                    spriteEnd = null;
+                }
+                spriteSegment++;
+                stopGapless();
                 waitIndicator.classList.add("visible");
                 statusBar.textContent = `À vous : ${dialogue.character}`;
                 playBeep();
@@ -906,7 +1655,7 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
                 // Auto-advance after a pause (3 seconds per line of text, min 3s)
                 const waitTime = Math.max(3000, dialogue.text.length * 80);
                 setTimeout(() => {
-                    if (isPlaying && currentDialogueIndex === scene.dialogues.indexOf(dialogue)) {
+                    if (isPlaying && getCurrentScene() === scene && currentDialogueIndex === scene.dialogues.indexOf(dialogue)) {
                         waitIndicator.classList.remove("visible");
                         advanceDialogue();
                     }
@@ -914,17 +1663,226 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
             } else {
                 waitIndicator.classList.remove("visible");
                 statusBar.textContent = isMuted ? `À vous : ${dialogue.character}` : `En cours : ${dialogue.character}`;
-                if (isMuted) playBeep();
-                audioPlayer.src = dialogue.audio;
-                audioPlayer.play().catch(e => {
-                    console.error("Audio play error:", e);
-                    statusBar.textContent = "Appuyez pour activer l'audio";
-                });
+                if (GAPLESS) {
+                    playDialogueGapless(currentDialogueIndex, naturalAdvance);
+                } else {
+                    if (isMuted) playBeep();
+                    playDialogueAudio(scene, dialogue);
+                }
             }
 
+            // Fetch the start of the next scene before reaching the end of this one
+            if (isContinuous() && currentDialogueIndex + 1 + PREFETCH_COUNT > scene.dialogues.length) {
+                prefetchNextSceneStart(scene);
+            }
             updateProgress();
         }
 
+        function playDialogueAudio(scene, dialogue) {
+            const segment = ++spriteSegment;
+            if (spriteFormatIndex >= 0 && scene.sprite && dialogue.start !== undefined) {
+                // Seek within the already buffered scene sprite
+                const url = new URL(scene.sprite[spriteFormatIndex], document.baseURI).href;
+                if (audioPlayer.src !== url) audioPlayer.src = url;
+                spriteEnd = dialogue.end;
+                if (audioPlayer.readyState >= 1) {
+                    audioPlayer.currentTime = dialogue.start;
+                } else {
+                    audioPlayer.addEventListener("loadedmetadata", () => {
+                        if (segment === spriteSegment) audioPlayer.currentTime = dialogue.start;
+                    }, { once: true });
+                }
+            } else {
+                spriteEnd = null;
+                audioPlayer.src = getAudioUrl(dialogue);
+            }
+
+            audioPlayer.play().then(() => {
+                if (spriteEnd !== null) requestAnimationFrame(() => watchSpriteEnd(segment));
+            }).catch(e => {
+                console.error("Audio play error:", e);
+                statusBar.textContent = "Appuyez pour activer l'audio";
+            });
+        }
+
+        // Gapless engine: the next lines are fetched and decoded ahead into AudioBuffers,
+        // and each line is scheduled on the AudioContext clock to start exactly when the
+        // previous one ends.
+        const GAPLESS = DRAMA_DATA.gapless === true && !!(window.AudioContext || window.webkitAudioContext);
+        const PREFETCH_COUNT = 3;
+        const BUFFER_CACHE_BYTES = 32 * 1024 * 1024;  // Of decoded PCM, which takes ~10x the compressed size
+        const bufferCache = new Map();  // url -> { promise: Promise<AudioBuffer>, bytes }, least recently used first
+        let gaplessToken = 0;
+        let gaplessCurrent = null;  // { index, source, endTime }
+        let gaplessNext = null;
+
+        function getAudioContext() {
+            if (!audioContext) audioContext = new (window.AudioContext || window.webkitAudioContext)();
+            return audioContext;
+        }
+
+        function trimBufferCache() {
+            // Buffers still being decoded count for nothing, the most recent one is always kept
+            let bytes = 0;
+            for (const entry of bufferCache.values()) bytes += entry.bytes;
+            for (const [url, entry] of bufferCache) {
+                if (bytes <= BUFFER_CACHE_BYTES || bufferCache.size === 1) break;
+                bufferCache.delete(url);
+                bytes -= entry.bytes;
+            }
+        }
+
+        function loadBuffer(url) {
+            let entry = bufferCache.get(url);
+            if (entry) {
+                bufferCache.delete(url);
+            } else {
+                entry = { bytes: 0 };
+                entry.promise = fetch(url)
+                    .then(response => {
+                        if (!response.ok) throw new Error(`${response.status} ${url}`);
+                        return response.arrayBuffer();
+                    })
+                    // Callback form, for older Safari
+                    .then(data => new Promise((resolve, reject) => getAudioContext().decodeAudioData(data, resolve, reject)));
+                entry.promise.then(buffer => {
+                    entry.bytes = buffer.length * buffer.numberOfChannels * 4;  // 32-bit float samples
+                    trimBufferCache();
+                }, () => {
+                    if (bufferCache.get(url) === entry) bufferCache.delete(url);
+                });
+            }
+            bufferCache.set(url, entry);
+            trimBufferCache();
+            return entry.promise;
+        }
+
+        function getLineAudio(scene, dialogue) {
+            // A sprite holds a whole scene: decoded into an AudioBuffer, it would take
+            // 100 MB+, so the gapless engine decodes the file of each line instead
+            if (!GAPLESS && spriteFormatIndex >= 0 && scene.sprite && dialogue.start !== undefined) {
+                return { url: scene.sprite[spriteFormatIndex], offset: dialogue.start, duration: dialogue.end - dialogue.start };
+            }
+            return { url: getAudioUrl(dialogue), offset: 0, duration: undefined };
+        }
+
+        function isMutedLine(dialogue) {
+            return dialogue.character_id === rehearseCharacter;
+        }
+
+        function prefetchAhead(scene, index) {
+            const last = Math.min(scene.dialogues.length, index + 1 + PREFETCH_COUNT);
+            for (let i = index; i < last; i++) {
+                loadBuffer(getLineAudio(scene, scene.dialogues[i]).url).catch(() => {});
+            }
+        }
+
+        const prefetchedUrls = new Set();
+
+        function prefetchNextSceneStart(scene) {
+            const entry = getNextPlaylistEntry(scene);
+            if (!entry) return;
+            loadScene(entry.scene).then(next => {
+                if (GAPLESS) {
+                    prefetchAhead(next, 0);
+                    return;
+                }
+                // Warm the HTTP (or service worker) cache for the audio element
+                const last = Math.min(next.dialogues.length, PREFETCH_COUNT);
+                for (let i = 0; i < last; i++) {
+                    const url = getLineAudio(next, next.dialogues[i]).url;
+                    if (prefetchedUrls.has(url)) continue;
+                    prefetchedUrls.add(url);
+                    fetch(url).then(response => response.arrayBuffer()).catch(() => prefetchedUrls.delete(url));
+                }
+            }).catch(() => {});
+        }
+
+        function stopGapless() {
+            gaplessToken++;
+            [gaplessCurrent, gaplessNext].forEach(playing => {
+                if (!playing) return;
+                playing.source.onended = null;
+                try { playing.source.stop(); } catch (e) { /* Not started yet */ }
+            });
+            gaplessCurrent = null;
+            gaplessNext = null;
+        }
+
+        function scheduleLine(scene, index, when, token) {
+            const dialogue = scene.dialogues[index];
+            const line = getLineAudio(scene, dialogue);
+            return loadBuffer(line.url).then(buffer => {
+                if (token !== gaplessToken) return null;
+                const context = getAudioContext();
+                const source = context.createBufferSource();
+                source.buffer = buffer;
+                source.connect(context.destination);
+                const startTime = Math.max(when, context.currentTime);
+                const duration = line.duration !== undefined ? line.duration : buffer.duration - line.offset;
+                source.start(startTime, line.offset, duration);
+                if (isMutedLine(dialogue)) playBeep(startTime);
+                const playing = { scene, index, source, endTime: startTime + duration };
+                source.onended = () => {
+                    if (token === gaplessToken && playing === gaplessCurrent) onAudioEnded();
+                };
+                return playing;
+            });
+        }
+
+        function scheduleFollowing(token) {
+            let scene = gaplessCurrent.scene;
+            let nextIndex = gaplessCurrent.index + 1;
+            prefetchAhead(scene, nextIndex);
+            if (nextIndex >= scene.dialogues.length) {
+                // Chain into the next scene of the playlist, if it is already loaded
+                const entry = isContinuous() ? getNextPlaylistEntry(scene) : null;
+                if (!entry || !entry.scene.dialogues || entry.scene.dialogues.length === 0) return;
+                scene = entry.scene;
+                nextIndex = 0;
+            }
+            // The wait indicator takes over for hidden lines
+            if (isMutedLine(scene.dialogues[nextIndex]) && hideRehearsalText) return;
+            scheduleLine(scene, nextIndex, gaplessCurrent.endTime, token).then(playing => {
+                if (playing) gaplessNext = playing;
+            }).catch(e => console.error("Audio load error:", e));
+        }
+
+        function playDialogueGapless(index, naturalAdvance) {
+            const scene = getCurrentScene();
+            if (naturalAdvance && gaplessNext && gaplessNext.scene === scene && gaplessNext.index === index) {
+                // Already scheduled to start right at the end of the previous line
+                gaplessCurrent = gaplessNext;
+                gaplessNext = null;
+                scheduleFollowing(gaplessToken);
+                return;
+            }
+
+            stopGapless();
+            const token = gaplessToken;
+            prefetchAhead(scene, index);
+            scheduleLine(scene, index, 0, token).then(playing => {
+                if (!playing) return;
+                gaplessCurrent = playing;
+                scheduleFollowing(token);
+            }).catch(e => {
+                console.error("Audio play error:", e);
+                statusBar.textContent = "Appuyez pour activer l'audio";
+            });
+        }
+
+        function watchSpriteEnd(segment) {
+            // timeupdate fires too rarely to stop exactly at the end of the line
+            if (segment !== spriteSegment || spriteEnd === null || audioPlayer.paused) return;
+            if (audioPlayer.currentTime >= spriteEnd) {
+                audioPlayer.pause();
+                spriteEnd = null;
+                onAudioEnded();
+                return;
+            }
+            requestAnimationFrame(() => watchSpriteEnd(segment));
+        }
+
         function onAudioEnded() {
             if (isPlaying) {
                 advanceDialogue();
@@ -936,53 +1894,111 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
             currentDialogueIndex++;
 
             if (currentDialogueIndex >= scene.dialogues.length) {
+                const entry = isContinuous() ? getNextPlaylistEntry(scene) : null;
+                if (entry) {
+                    continueWithScene(entry);
+                    return;
+                }
                 currentDialogueIndex = scene.dialogues.length - 1;
                 stop();
             } else {
-                playCurrentDialogue();
+                playCurrentDialogue(true);
             }
         }
 
-        function getMyLineIndices() {
+        // In continuous playback, the previous and next lines of the rehearsed character can be
+        // in other scenes: found by binary search in the line indices of each act
+        function findMyLine(direction) {
+            // {entry, index} of the previous (-1) or next (1) line, index null for the first
+            // or last line of a scene not loaded yet
             const scene = getCurrentScene();
-            const indices = [];
-            scene.dialogues.forEach((d, i) => {
-                if (d.character.toLowerCase() === rehearseCharacter.toLowerCase()) {
-                    indices.push(i);
+            if (!scene.dialogues) return null;
+            const entry = ALL_SCENES[scenePositions.get(scene)];
+            const after = direction > 0 ? 1 : 0;
+            const lines = scene.character_lines[rehearseCharacter] || [];
+            const k = lowerBound(lines, currentDialogueIndex + after) - 1 + after;
+            if (k >= 0 && k < lines.length) return { entry, index: lines[k] };
+            if (!isContinuous()) return null;
+
+            const playLine = scene.first_line + currentDialogueIndex;
+            for (let a = entry.actIndex; a >= 0 && a < DRAMA_DATA.acts.length; a += direction) {
+                if (playlistSelect.value === "act" && a !== entry.actIndex) break;
+                const act = DRAMA_DATA.acts[a];
+                if (!act.character_lines) return findMyScene(entry, direction);
+                const actLines = act.character_lines[rehearseCharacter] || [];
+                const j = lowerBound(actLines, playLine - act.first_line + after) - 1 + after;
+                if (j >= 0 && j < actLines.length) return findLineScene(act, act.first_line + actLines[j]);
+            }
+            return null;
+        }
+
+        function findLineScene(act, playLine) {
+            // {entry, index} of a line of the act, from its index in the play
+            let lo = 0;
+            let hi = act.scenes.length - 1;
+            while (lo < hi) {
+                const mid = (lo + hi + 1) >> 1;
+                if (act.scenes[mid].first_line <= playLine) lo = mid;
+                else hi = mid - 1;
+            }
+            const scene = act.scenes[lo];
+            return { entry: ALL_SCENES[scenePositions.get(scene)], index: playLine - scene.first_line };
+        }
+
+        function findMyScene(entry, direction) {
+            // Split builds only index the line counts of each scene: the nearest one with lines
+            for (let i = scenePositions.get(entry.scene) + direction; i >= 0 && i < ALL_SCENES.length; i += direction) {
+                const other = ALL_SCENES[i];
+                if (playlistSelect.value === "act" && other.actIndex !== entry.actIndex) return null;
+                if (getCharacterLineCount(other.scene, rehearseCharacter) > 0) {
+                    return { entry: other, index: null, last: direction < 0 };
                 }
-            });
-            return indices;
+            }
+            return null;
         }
 
-        function goToPrevMyLine() {
-            const indices = getMyLineIndices();
-            if (indices.length === 0) return;
-            const prevIndex = indices.filter(i => i < currentDialogueIndex).pop();
-            if (prevIndex !== undefined) {
-                currentDialogueIndex = prevIndex;
-                waitIndicator.classList.remove("visible");
-                highlightCurrent();
-                updateProgress();
-                if (isPlaying) playCurrentDialogue();
-                else updateStatus();
+        function goToMyLineIn(target) {
+            if (!target) return;
+            const scene = getCurrentScene();
+            if (target.entry.scene === scene) {
+                goToMyLine(target.index);
+                return;
             }
+            // Loaded first, so that the current line plays on until the jump
+            loadScene(target.entry.scene).then(loaded => {
+                if (getCurrentScene() !== scene) return;
+                const lines = loaded.character_lines[rehearseCharacter] || [];
+                const index = target.index !== null ? target.index : lines[target.last ? lines.length - 1 : 0];
+                if (index === undefined) return;
+                waitIndicator.classList.remove("visible");
+                showSceneAt(target.entry, index).then(shown => {
+                    if (!shown) return;
+                    updateProgress();
+                    if (isPlaying) playCurrentDialogue();
+                });
+            }).catch(e => console.error("Scene load error:", e));
+        }
+
+        function goToMyLine(index) {
+            if (index === undefined) return;
+            currentDialogueIndex = index;
+            waitIndicator.classList.remove("visible");
+            highlightCurrent();
+            updateProgress();
+            if (isPlaying) playCurrentDialogue();
+            else updateStatus();
+        }
+
+        function goToPrevMyLine() {
+            goToMyLineIn(findMyLine(-1));
         }
 
         function goToNextMyLine() {
-            const indices = getMyLineIndices();
-            if (indices.length === 0) return;
-            const nextIndex = indices.find(i => i > currentDialogueIndex);
-            if (nextIndex !== undefined) {
-                currentDialogueIndex = nextIndex;
-                waitIndicator.classList.remove("visible");
-                highlightCurrent();
-                updateProgress();
-                if (isPlaying) playCurrentDialogue();
-                else updateStatus();
-            }
+            goToMyLineIn(findMyLine(1));
         }
 
         function prevDialogue() {
+            if (!getCurrentScene().dialogues) return;
             waitIndicator.classList.remove("visible");
             currentDialogueIndex = Math.max(0, currentDialogueIndex - 1);
             highlightCurrent();
@@ -992,6 +2008,7 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
 
         function nextDialogue() {
             const scene = getCurrentScene();
+            if (!scene.dialogues) return;
             waitIndicator.classList.remove("visible");
             if (currentDialogueIndex < scene.dialogues.length - 1) {
                 currentDialogueIndex++;
@@ -1003,6 +2020,7 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
 
         function updateProgress() {
             const scene = getCurrentScene();
+            if (!scene.dialogues) return;
             const total = scene.dialogues.length;
             const progress = ((currentDialogueIndex + 1) / total) * 100;
             progressFill.style.width = progress + "%";
@@ -1010,7 +2028,103 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
 
         function updateStatus() {
             const scene = getCurrentScene();
-            statusBar.textContent = `Réplique ${currentDialogueIndex + 1} sur ${scene.dialogues.length}`;
+            if (!scene.dialogues) {
+                statusBar.textContent = "Chargement…";
+                return;
+            }
+            let status = `Réplique ${currentDialogueIndex + 1} sur ${scene.dialogues.length}`;
+            if (isContinuous()) status += ` · ${scene.first_line + currentDialogueIndex + 1}/${DRAMA_DATA.line_count}`;
+            statusBar.textContent = status;
+        }
+
+        // Offline mode: the service worker serves audio from the Cache Storage, where the chosen
+        // scenes are downloaded ahead. Cached files are keyed by their content hash.
+        const OFFLINE = "serviceWorker" in navigator && "caches" in window && location.protocol !== "file:";
+        const SERVICE_WORKER_URL = "__SERVICE_WORKER__";
+        const PRECACHE_MANIFEST_URL = "__PRECACHE_MANIFEST__";
+        const AUDIO_CACHE = "prettydrama-audio";
+        const DOWNLOAD_CONCURRENCY = 4;
+        let offlineDownloading = false;
+
+        function setupOffline() {
+            if (!OFFLINE) return;
+            offlineSection.classList.add("available");
+            navigator.serviceWorker.register(SERVICE_WORKER_URL).catch(e => console.error("Service worker error:", e));
+            offlineBtn.addEventListener("click", downloadForOffline);
+            updateStorageStatus();
+        }
+
+        function formatBytes(bytes) {
+            if (bytes >= 1e9) return `${(bytes / 1e9).toFixed(1)} Go`;
+            return `${Math.round(bytes / 1e6)} Mo`;
+        }
+
+        async function updateStorageStatus(prefix = "") {
+            if (!navigator.storage || !navigator.storage.estimate) {
+                offlineStatus.textContent = prefix;
+                return;
+            }
+            const { usage, quota } = await navigator.storage.estimate();
+            offlineStatus.textContent = `${prefix}${formatBytes(usage)} / ${formatBytes(quota)}`;
+        }
+
+        function getOfflineScenes(selection) {
+            if (selection === "act") return DRAMA_DATA.acts[currentActIndex].scenes;
+            if (selection === "character" && rehearseCharacter) {
+                return DRAMA_DATA.acts.flatMap(act => act.scenes)
+                    .filter(scene => getCharacterLineCount(scene, rehearseCharacter) > 0);
+            }
+            return [getCurrentScene()];
+        }
+
+        async function downloadForOffline() {
+            if (offlineDownloading) return;
+            offlineDownloading = true;
+            offlineBtn.disabled = true;
+            try {
+                // Ask the browser not to evict the downloaded audio under storage pressure
+                if (navigator.storage && navigator.storage.persist) await navigator.storage.persist();
+                const manifest = await fetch(PRECACHE_MANIFEST_URL, { cache: "no-cache" }).then(response => response.json());
+
+                // The same files as playback: scene files, then sprites or per-line files in the browser's format
+                const scenes = getOfflineScenes(offlineSelect.value);
+                await Promise.all(scenes.map(loadScene));
+                const urls = [...new Set(scenes.flatMap(scene => [
+                    ...(scene.url ? [scene.url] : []),
+                    ...scene.dialogues.map(dialogue => getLineAudio(scene, dialogue).url),
+                ]))].filter(url => manifest.assets[url]);
+
+                const cache = await caches.open(AUDIO_CACHE);
+                let next = 0;
+                let done = 0;
+                let failed = 0;
+                const downloadNext = async () => {
+                    while (next < urls.length) {
+                        const url = urls[next++];
+                        const key = new URL(`${url}?v=${manifest.assets[url]}`, document.baseURI).href;
+                        try {
+                            if (!await cache.match(key)) {
+                                const response = await fetch(url, { cache: "no-cache" });
+                                if (!response.ok) throw new Error(`${response.status} ${url}`);
+                                await cache.put(key, response);
+                            }
+                        } catch (e) {
+                            failed++;
+                            console.error("Offline download error:", e);
+                        }
+                        done++;
+                        offlineStatus.textContent = `${done} / ${urls.length}`;
+                    }
+                };
+                await Promise.all(Array.from({ length: DOWNLOAD_CONCURRENCY }, downloadNext));
+                await updateStorageStatus(failed ? `${failed} échecs · ` : "✓ ");
+            } catch (e) {
+                console.error("Offline download error:", e);
+                offlineStatus.textContent = "Échec du téléchargement";
+            } finally {
+                offlineDownloading = false;
+                offlineBtn.disabled = false;
+            }
         }
 
         init();
@@ -1021,17 +2135,46 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
 
 
 def main():
-    print("Loading drama...")
-    drama = Drama.from_file(DRAMA_FILE)
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--drama", default=DRAMA_FILE, help="Drama text file")
+    parser.add_argument("--sprites", action="store_true",
+                        help="Concatenate each scene into one compressed audio sprite (requires ffmpeg)")
+    parser.add_argument("--gapless", action="store_true",
+                        help="Play through the Web Audio API, with the next lines decoded ahead")
+    parser.add_argument("--compact", action="store_true",
+                        help="Ship the dialogues as columns, with interned character names")
+    parser.add_argument("--split-scenes", action="store_true",
+                        help=f"Only inline an index in the page, each scene is loaded from {SCENE_DIR}/ on demand")
+    args = parser.parse_args()
 
-    print("Generating drama data...")
-    drama_data = generate_drama_data(drama, TTS_OUTPUT_DIR)
+    print("Loading drama...")
+    with open_drama(args.drama) as drama:
+        print("Generating drama data...")
+        drama_data = generate_drama_data(drama, TTS_OUTPUT_DIR, EXPORT_DIR)
+    if drama_data["audio_types"]:
+        print(f"Compressed audio: {', '.join(drama_data['audio_types'])}")
+    if args.sprites:
+        add_scene_sprites(drama_data, SPRITE_DIR)
+    if args.gapless:
+        drama_data["gapless"] = True
+
+    page_data = compact_drama_data(drama_data) if args.compact else drama_data
+    scene_urls: list[str] = []
+    if args.split_scenes:
+        print("Writing scene files...")
+        page_data = split_scene_chunks(page_data, SCENE_DIR)
+        scene_urls = [scene["url"] for act in page_data["acts"] for scene in act["scenes"]]
 
     print("Generating HTML...")
-    html = HTML_TEMPLATE.replace("__DRAMA_DATA__", json.dumps(drama_data, ensure_ascii=False))
+    html = render_html(page_data)
 
     with open(OUTPUT_HTML, "w", encoding="utf-8") as f:
         f.write(html)
+    print(f"Page: {len(html.encode('utf-8')) / 1e6:.1f} MB")
+
+    print("Hashing audio for offline use...")
+    version = write_offline_files(drama_data, html, os.path.dirname(OUTPUT_HTML) or ".", scene_urls)
+    print(f"Service worker version: {version}")
 
     print(f"Done! Open {OUTPUT_HTML} in a browser.")
     print(f"Characters: {', '.join(drama_data['characters'])}")
@@ -1,60 +1,31 @@
-import os
-import torch
-import torchaudio
-from TTS.api import TTS
-from drama import Drama
-
-
-def clean_text_for_tts(text: str) -> str:
-    """Clean text to reduce end-of-sentence TTS artifacts."""
-    text = text.strip()
-    # Ensure sentence ends with punctuation (helps XTTS end cleanly)
-    if text and text[-1] not in '.!?…;:':
-        text += '.'
-    return text
-
-
-def load_vad_model():
-    """Load Silero VAD model."""
-    model, utils = torch.hub.load(
-        repo_or_dir='snakers4/silero-vad',
-        model='silero_vad',
-        force_reload=False,
-        trust_repo=True,
-    )
-    return model, utils
-
+#!/usr/bin/python3
+"""Generate the TTS audio of every dialogue of the drama.
 
-def trim_audio_with_vad(audio_path: str, vad_model, get_speech_timestamps, read_audio, save_audio, buffer_ms: int = 150):
-    """Trim trailing silence/artifacts using VAD."""
-    SAMPLE_RATE = 16000
-
-    # Load and resample audio for VAD (requires 16kHz)
-    wav, sr = torchaudio.load(audio_path)
-    if sr != SAMPLE_RATE:
-        resampler = torchaudio.transforms.Resample(sr, SAMPLE_RATE)
-        wav_16k = resampler(wav)
-    else:
-        wav_16k = wav
-
-    # Get speech timestamps
-    speech_timestamps = get_speech_timestamps(wav_16k.squeeze(), vad_model, sampling_rate=SAMPLE_RATE)
-
-    if not speech_timestamps:
-        return  # No speech detected, keep original
-
-    # Find end of last speech segment
-    last_speech_end = speech_timestamps[-1]['end']
-
-    # Convert back to original sample rate and add buffer
-    buffer_samples = int(buffer_ms * sr / 1000)
-    end_sample_orig = int(last_speech_end * sr / SAMPLE_RATE) + buffer_samples
-    end_sample_orig = min(end_sample_orig, wav.shape[1])
+torch, the TTS backends and the VAD are only imported once a line has to be
+synthesized, so that --dry-run answers without them.
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import shutil
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable
 
-    # Trim and save
-    trimmed = wav[:, :end_sample_orig]
-    torchaudio.save(audio_path, trimmed, sr)
+import tts_trace
+from drama import Drama
+from drama_pack import open_drama
+from line_manifest import line_audio_path, prune_line_audio, save_line_manifest
+from wav_files import read_wav_header
 
+if TYPE_CHECKING:
+    from trim_tts import TrimStage
+    from tts_backends import TTSBackend
 
 # ==== SETTINGS PROFILE ====
 # Choose: "default", "stable", or "balanced"
@@ -86,12 +57,14 @@ PROFILES = {
     },
 }
 
-TTS_SETTINGS = PROFILES[PROFILE]["settings"]
-OUTPUT_DIR = PROFILES[PROFILE]["output_dir"]
+DRAMA_FILE = "/root/full_drama.txt"
+MODEL_NAME = "tts_models/multilingual/multi-dataset/xtts_v2"
+LANGUAGE = "fr"
+VAD_BUFFER_MS = 150
 
-print(f"Using profile: {PROFILE}")
-print(f"Settings: {TTS_SETTINGS or 'default'}")
-print(f"Output: {OUTPUT_DIR}")
+# Lines of the same speaker per synthesize_batch() call, 0 for one synthesize() call per line.
+# XTTS has no batched inference: a batch is still synthesized line by line.
+BATCH_SIZE = 0
 
 # Voice mapping for characters
 VOICE_MAP = {
@@ -109,57 +82,556 @@ VOICE_MAP = {
     "charlotte": "Claribel Dervla",
 }
 
-print("Loading drama file...")
-drama = Drama.from_file("/root/full_drama.txt")
 
-print("Loading TTS model...")
-tts = TTS(model_name="tts_models/multilingual/multi-dataset/xtts_v2")
-tts.to("cuda")
+def clean_text_for_tts(text: str) -> str:
+    """Clean text to reduce end-of-sentence TTS artifacts."""
+    text = text.strip()
+    # Ensure sentence ends with punctuation (helps XTTS end cleanly)
+    if text and text[-1] not in '.!?…;:':
+        text += '.'
+    return text
+
+
+@dataclass
+class TTSJob:
+    """A single dialogue line to synthesize."""
+    number: int  # Position in the whole play, for [current/total] reporting
+    act_idx: int
+    scene_idx: int
+    dialogue_id: str
+    character: str
+    speaker: str
+    dialogue: str
+    clean_text: str
+    key: str
+    output_path: str
+
+
+def tts_cache_key(text: str, speaker: str, language: str, settings: dict, model_name: str, vad: str) -> str:
+    """Hash every input that changes the synthesized audio of a line.
+
+    The VAD buffer is not part of it: a cache entry can be re-trimmed in place,
+    so its buffer is recorded in the journal instead.
+    """
+    payload = json.dumps({
+        "text": text,
+        "speaker": speaker,
+        "language": language,
+        "settings": settings,
+        "model": model_name,
+        "vad": vad,
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def group_jobs_by_speaker(jobs: list[TTSJob], batch_size: int) -> list[list[TTSJob]]:
+    """Group jobs by speaker, then split each group into batches of at most batch_size."""
+    jobs_by_speaker: dict[str, list[TTSJob]] = {}
+    for job in jobs:
+        jobs_by_speaker.setdefault(job.speaker, []).append(job)
+
+    batches: list[list[TTSJob]] = []
+    for speaker_jobs in jobs_by_speaker.values():
+        for start in range(0, len(speaker_jobs), batch_size):
+            batches.append(speaker_jobs[start:start + batch_size])
+    return batches
+
+
+def load_manifest(manifest_path: str) -> dict[str, list[str]]:
+    """Load the cache manifest (cache key -> output files), empty if missing."""
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest_path: str, manifest: dict[str, list[str]]) -> None:
+    """Write the cache manifest atomically."""
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def place_cached_audio(cache_path: str, output_path: str) -> None:
+    """Expose a cached file at its output path (hard link, copy as fallback).
+
+    The file is first linked under a temporary name, then renamed over the output.
+    """
+    if os.path.exists(output_path) and os.path.samefile(cache_path, output_path):
+        return
+    tmp_path = f"{output_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(cache_path, tmp_path)
+    except OSError:
+        shutil.copyfile(cache_path, tmp_path)
+    os.replace(tmp_path, output_path)
+
+
+def load_journal(journal_path: str) -> dict[str, dict]:
+    """Load the journal of completed cache entries (cache key -> WAV header info and VAD buffer)."""
+    journal: dict[str, dict] = {}
+    if not os.path.exists(journal_path):
+        return journal
+    with open(journal_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Last line cut by a crash
+            journal[entry["key"]] = entry
+    return journal
+
+
+def append_journal(journal_file, key: str, cache_path: str, vad_buffer_ms: int) -> dict | None:
+    """Record a completed cache entry, trimmed with a VAD buffer, and make sure it reaches the disk.
+
+    Without journal_file, only return the entry.
+    """
+    header = read_wav_header(cache_path)
+    if header is None:
+        return None
+    entry = {"key": key, "sample_rate": header[0], "frames": header[1], "vad_buffer_ms": vad_buffer_ms}
+    if journal_file is None:
+        return entry
+    journal_file.write(json.dumps(entry) + "\n")
+    journal_file.flush()
+    os.fsync(journal_file.fileno())
+    return entry
+
+
+def is_cache_complete(cache_path: str, entry: dict | None, verify: str) -> bool:
+    """Check a cache entry recorded in the journal.
+
+    verify is "none" (trust the journal), "header" (the WAV header is sane)
+    or "duration" (the header also matches the journaled duration).
+    """
+    if entry is None or not os.path.exists(cache_path):
+        return False
+    if verify == "none":
+        return True
+    header = read_wav_header(cache_path)
+    if header is None or header[1] == 0:
+        return False
+    if verify == "duration":
+        return header == (entry["sample_rate"], entry["frames"])
+    return True
+
+
+def collect_jobs(drama: Drama, output_dir: str, settings: dict, model_name: str,
+                 vad: str) -> tuple[list[TTSJob], list[tuple[int, str]]]:
+    """List the lines of the drama that have a voice, with their cache key.
+
+    Also return the (position in the play, character) of the lines without a voice.
+    """
+    drama.assign_voices(VOICE_MAP)
+    jobs: list[TTSJob] = []
+    missing_voice: list[tuple[int, str]] = []
+    current_line = 0
+    for act_idx, act in enumerate(drama.acts, start=1):
+        for scene_idx, scene in enumerate(act.scenes, start=1):
+            for dialogue_id, dialogue in zip(scene.ids, scene.dialogues):
+                current_line += 1
+                character = dialogue.character
 
-print("Loading VAD model for trimming...")
-vad_model, vad_utils = load_vad_model()
-(get_speech_timestamps, save_audio, read_audio, VADIterator, collect_chunks) = vad_utils
+                if character.voice is None:
+                    missing_voice.append((current_line, character.name))
+                    continue
 
-total_lines = sum(
-    len(scene.dialogues)
-    for act in drama.acts
-    for scene in act.scenes
-)
-current_line = 0
+                with tts_trace.span("clean_text", dialogue_id=dialogue_id):
+                    clean_dialogue = clean_text_for_tts(dialogue.text)
+                key = tts_cache_key(clean_dialogue, character.voice, LANGUAGE, settings, model_name, vad)
+                jobs.append(TTSJob(current_line, act_idx, scene_idx, dialogue_id, character.name, character.voice,
+                                   dialogue.text, clean_dialogue, key,
+                                   f"{output_dir}/{line_audio_path(dialogue_id)}"))
+    return jobs, missing_voice
 
-for act_idx, act in enumerate(drama.acts, start=1):
-    act_dir = f"{OUTPUT_DIR}/act{act_idx}"
-    os.makedirs(act_dir, exist_ok=True)
 
-    for scene_idx, scene in enumerate(act.scenes, start=1):
-        scene_dir = f"{act_dir}/scene{scene_idx}"
-        os.makedirs(scene_dir, exist_ok=True)
+def find_pending_jobs(jobs: list[TTSJob], cache_dir: str, journal_path: str, verify: str,
+                      vad_buffer_ms: int = VAD_BUFFER_MS, dry_run: bool = False) -> dict[str, TTSJob]:
+    """Return the jobs missing from the cache, once per cache key.
 
-        for line_idx, (character, dialogue) in enumerate(scene.dialogues, start=1):
-            current_line += 1
-            speaker = VOICE_MAP.get(character.lower())
+    Cache files are only trusted if they are in the journal, trimmed with
+    vad_buffer_ms, and pass verification. Files written before the journal
+    existed are adopted if their header is sane. With dry_run, the cache and
+    the journal are left untouched.
+    """
+    # Leftovers of an interrupted run
+    if not dry_run:
+        for filename in os.listdir(cache_dir):
+            if filename.endswith(".tmp.wav"):
+                os.remove(f"{cache_dir}/{filename}")
 
-            if speaker is None:
-                print(f"[{current_line}/{total_lines}] Warning: No voice mapping for '{character}', skipping")
+    journal = load_journal(journal_path)
+    pending: dict[str, TTSJob] = {}
+    other_buffer = 0
+    journal_file = None if dry_run else open(journal_path, "a", encoding="utf-8")
+    try:
+        for job in jobs:
+            if job.key in pending:
                 continue
+            cache_path = f"{cache_dir}/{job.key}.wav"
+            if job.key not in journal and os.path.exists(cache_path):
+                entry = append_journal(journal_file, job.key, cache_path, VAD_BUFFER_MS)
+                if entry is not None:
+                    journal[job.key] = entry
+            entry = journal.get(job.key)
+            if entry is not None and entry.get("vad_buffer_ms", VAD_BUFFER_MS) != vad_buffer_ms:
+                other_buffer += 1
+                entry = None
+            if not is_cache_complete(cache_path, entry, verify):
+                if os.path.exists(cache_path) and not dry_run:
+                    os.remove(cache_path)
+                pending[job.key] = job
+    finally:
+        if journal_file is not None:
+            journal_file.close()
+    if other_buffer:
+        print(f"{other_buffer} cached lines were trimmed with another VAD buffer than {vad_buffer_ms} ms, "
+              f"and are synthesized again (see --vad-buffer-ms)")
+    return pending
+
+
+@dataclass
+class SynthesisConfig:
+    """Everything a worker needs to synthesize jobs into the cache."""
+    backend: str
+    vad: str
+    cache_dir: str
+    settings: dict
+    batched: bool  # One synthesize_batch() call per work item, instead of synthesize()
+    vad_buffer_ms: int = VAD_BUFFER_MS
+    vad_threads: int = 1
+    profile: str = ""  # Only reported in the trace
+    trace_path: str | None = None  # Trace file appended to by every worker, see tts_trace.py
+    server: str | None = None  # URL of a TTS server synthesizing instead of the workers, see tts_server.py
+
+
+def make_work_items(jobs: list[TTSJob], batch_size: int) -> list[list[TTSJob]]:
+    """Split jobs into work items (speaker batches), longest text first for load balancing."""
+    jobs = sorted(jobs, key=lambda job: len(job.clean_text), reverse=True)
+    if batch_size > 0:
+        items = group_jobs_by_speaker(jobs, batch_size)
+    else:
+        items = [[job] for job in jobs]
+    return sorted(items, key=lambda item: sum(len(job.clean_text) for job in item), reverse=True)
+
+
+def synthesize_work_item(backend: "TTSBackend", item: list[TTSJob], config: SynthesisConfig,
+                         trim_stage: "TrimStage") -> None:
+    """Synthesize the jobs of a work item, and hand them to the trimming stage.
+
+    The trimming stage writes each file under a temporary name and renames it
+    once trimmed, so that the cache never contains partial audio.
+    """
+    from trim_tts import TrimTask, to_pcm16
+
+    bounds = [tts_trace.now_us()]
+    if config.batched:
+        wavs = backend.synthesize_batch([job.clean_text for job in item], item[0].speaker,
+                                        LANGUAGE, config.settings)
+        # The time of each line is not measured: split the batch by text length
+        end = tts_trace.now_us()
+        total_chars = sum(len(job.clean_text) for job in item) or 1
+        for job in item:
+            bounds.append(bounds[-1] + (end - bounds[0]) * len(job.clean_text) / total_chars)
+    else:
+        wavs = []
+        for job in item:
+            wavs.append(backend.synthesize(job.clean_text, job.speaker, LANGUAGE, config.settings))
+            bounds.append(tts_trace.now_us())
+
+    tts_trace.complete("synthesize", bounds[0], bounds[-1], speaker=item[0].speaker, lines=len(item))
+    for job, wav, start, end in zip(item, wavs, bounds, bounds[1:]):
+        tts_trace.complete("synthesize_line", start, end, dialogue_id=job.dialogue_id, speaker=job.speaker,
+                           profile=config.profile, text=job.clean_text, audio_s=wav.shape[-1] / backend.sample_rate)
+    tts_trace.record_memory()
+
+    for job, wav in zip(item, wavs):
+        trim_stage.submit(TrimTask(to_pcm16(wav), backend.sample_rate,
+                                   f"{config.cache_dir}/{job.key}.wav", job))
+
+
+def run_synthesis(backend: "TTSBackend", items: list[list[TTSJob]], config: SynthesisConfig,
+                  on_done: Callable[[TTSJob], None]) -> None:
+    """Synthesize work items on this process, while VAD trimming runs on background threads."""
+    from trim_tts import TrimStage
+
+    trim_stage = TrimStage(config.vad, config.vad_buffer_ms, lambda task: on_done(task.payload),
+                           n_threads=config.vad_threads)
+    try:
+        for item in items:
+            synthesize_work_item(backend, item, config, trim_stage)
+    finally:
+        trim_stage.close()
+
+
+def print_job(job: TTSJob, current: int, total: int, worker_idx: int | None = None) -> None:
+    """Print the progress line of a synthesized job."""
+    worker = f" (worker {worker_idx})" if worker_idx is not None else ""
+    print(f"[{current}/{total}] Act {job.act_idx}, Scene {job.scene_idx}: {job.character} -> {job.speaker}{worker}")
+    print(f"    Text: {job.dialogue[:50]}{'...' if len(job.dialogue) > 50 else ''}")
+
+
+def run_remote_synthesis(items: list[list[TTSJob]], config: SynthesisConfig, n_requests: int,
+                         on_done: Callable[[TTSJob], None]) -> None:
+    """Send work items to a TTS server, n_requests at a time, and write the returned audio to the cache.
+
+    The server trims the audio. Each file is written under a temporary name then renamed.
+    """
+    from tts_server import TTSClient
+
+    client = TTSClient(config.server)
+
+    def synthesize(item: list[TTSJob]) -> list[TTSJob]:
+        with tts_trace.span("synthesize_remote", speaker=item[0].speaker, lines=len(item)):
+            wavs = client.synthesize([job.clean_text for job in item], item[0].speaker, LANGUAGE,
+                                     config.settings, config.vad_buffer_ms)
+        for job, wav in zip(item, wavs):
+            cache_path = f"{config.cache_dir}/{job.key}.wav"
+            tmp_path = f"{os.path.splitext(cache_path)[0]}.tmp.wav"
+            with open(tmp_path, "wb") as f:
+                f.write(wav)
+            os.replace(tmp_path, cache_path)
+        return item
+
+    with ThreadPoolExecutor(n_requests) as pool:
+        for future in as_completed([pool.submit(synthesize, item) for item in items]):
+            for job in future.result():
+                on_done(job)
+
+
+def load_warm_backend(name: str, device: str) -> "TTSBackend":
+    """Load a backend, and run its warmup synthesis."""
+    from tts_backends import load_backend
+
+    with tts_trace.span("model_load", backend=name, device=device):
+        backend = load_backend(name, MODEL_NAME, device)
+    with tts_trace.span("warmup", backend=name, device=device):
+        backend.warmup()
+    return backend
+
+
+def print_plan(jobs: list[TTSJob], pending: dict[str, TTSJob], missing_voice: list[tuple[int, str]],
+               total_lines: int) -> None:
+    """List every line of the play with what a run would do with it."""
+    plan = [(job.number, f"{'synthesize' if job.key in pending else 'cached':<10}  Act {job.act_idx}, "
+                         f"Scene {job.scene_idx}: {job.character} -> {job.speaker}: {job.dialogue[:50]}")
+            for job in jobs]
+    plan += [(number, f"{'no voice':<10}  {character}") for number, character in missing_voice]
+    for number, description in sorted(plan):
+        print(f"[{number}/{total_lines}] {description}")
+    n_pending = sum(job.key in pending for job in jobs)
+    print(f"{n_pending} lines to synthesize ({len(pending)} distinct), {len(jobs) - n_pending} cached, "
+          f"{len(missing_voice)} without a voice")
+
+
+def _iter_work_items(work_queue):
+    while (item := work_queue.get()) is not None:
+        yield item
+
+
+def tts_worker(worker_idx: int, device: str, config: SynthesisConfig, work_queue, result_queue) -> None:
+    """Worker process: own model instance, pulls work items until it gets None."""
+    try:
+        if config.trace_path:
+            tts_trace.enable(config.trace_path)
+        backend = load_warm_backend(config.backend, device)
+        run_synthesis(backend, _iter_work_items(work_queue), config,
+                      lambda job: result_queue.put((worker_idx, job, None)))
+    except Exception:
+        result_queue.put((worker_idx, None, traceback.format_exc()))
+
+
+def synthesize_jobs(jobs: list[TTSJob], config: SynthesisConfig, batch_size: int,
+                    devices: list[str], n_workers: int, journal_path: str) -> None:
+    """Synthesize jobs into the cache, with one model per worker process.
+
+    Workers are assigned to devices round-robin. A single worker runs in this process.
+    Completed jobs are appended to the journal, so that an interrupted run can resume.
+    """
+    with open(journal_path, "a", encoding="utf-8") as journal_file:
+        _synthesize_jobs(jobs, config, batch_size, devices, n_workers, journal_file)
+
+
+def _synthesize_jobs(jobs: list[TTSJob], config: SynthesisConfig, batch_size: int,
+                     devices: list[str], n_workers: int, journal_file) -> None:
+    items = make_work_items(jobs, batch_size)
+    done = 0
+
+    def on_done(job: TTSJob, worker_idx: int | None = None) -> None:
+        nonlocal done
+        append_journal(journal_file, job.key, f"{config.cache_dir}/{job.key}.wav", config.vad_buffer_ms)
+        done += 1
+        print_job(job, done, len(jobs), worker_idx)
+
+    if config.server:
+        print(f"Sending lines to {config.server}...")
+        run_remote_synthesis(items, config, n_workers, on_done)
+        return
+
+    if n_workers <= 1:
+        print("Loading TTS model...")
+        backend = load_warm_backend(config.backend, devices[0])
+        run_synthesis(backend, items, config, on_done)
+        return
+
+    # CUDA can't be re-initialized in forked processes
+    context = multiprocessing.get_context("spawn")
+    work_queue = context.Queue()
+    result_queue = context.Queue()
+    for item in items:
+        work_queue.put(item)
+    for _ in range(n_workers):
+        work_queue.put(None)
+
+    print(f"Starting {n_workers} workers on {', '.join(devices)}...")
+    workers = [context.Process(target=tts_worker,
+                               args=(worker_idx, devices[worker_idx % len(devices)], config,
+                                     work_queue, result_queue))
+               for worker_idx in range(n_workers)]
+    for worker in workers:
+        worker.start()
+
+    try:
+        while done < len(jobs):
+            try:
+                worker_idx, job, error = result_queue.get(timeout=1)
+            except queue.Empty:
+                if any(worker.exitcode not in (None, 0) for worker in workers):
+                    raise RuntimeError("A TTS worker died unexpectedly")
+                continue
+            if error is not None:
+                raise RuntimeError(f"TTS worker {worker_idx} failed:\n{error}")
+            on_done(job, worker_idx)
+    finally:
+        for worker in workers:
+            if worker.is_alive() and done < len(jobs):
+                worker.terminate()
+            worker.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--drama", default=DRAMA_FILE, help="Drama text file")
+    parser.add_argument("--profile", default=PROFILE, choices=sorted(PROFILES))
+    parser.add_argument("--output-dir", help="Defaults to the output directory of the profile")
+    parser.add_argument("--backend", default="xtts", choices=["xtts", "sine"],
+                        help="\"sine\" is a deterministic CPU stand-in for XTTS")
+    parser.add_argument("--device", default="cuda")
+    parser.add_argument("--vad", default="silero", choices=["silero", "energy"],
+                        help="\"energy\" is an offline stand-in for Silero VAD")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help="Lines of a speaker per work item, 0 for one line per work item")
+    parser.add_argument("--vad-buffer-ms", type=int, default=VAD_BUFFER_MS,
+                        help="Audio kept after the end of speech. Recorded in the journal: cached lines "
+                             "trimmed with another buffer are synthesized again")
+    parser.add_argument("--vad-threads", type=int, default=1,
+                        help="Background threads trimming synthesized lines with VAD")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes, each with its own model instance (with --server, "
+                             "concurrent requests)")
+    parser.add_argument("--devices",
+                        help="Comma-separated devices assigned round-robin to workers "
+                             "(e.g. cuda:0,cuda:1), defaults to --device")
+    parser.add_argument("--verify", default="header", choices=["none", "header", "duration"],
+                        help="Check of the journaled lines before skipping them on restart")
+    parser.add_argument("--trace", metavar="TRACE_JSONL",
+                        help="Record the time of each stage and line there, and next to it in the Chrome "
+                             "trace-event format (.chrome.json), then print a summary")
+    parser.add_argument("--server", metavar="URL",
+                        help="Synthesize through a running tts_server.py (e.g. http://127.0.0.1:8765), "
+                             "which keeps its models loaded. Its backend replaces --backend")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="List the lines to synthesize, cached, and without a voice, then exit")
+    args = parser.parse_args()
+    if args.trace:
+        tts_trace.enable(args.trace, truncate=True)
+
+    settings = PROFILES[args.profile]["settings"]
+    output_dir = args.output_dir or PROFILES[args.profile]["output_dir"]
+    model_name = MODEL_NAME if args.backend == "xtts" else args.backend
+    vad = args.vad
+    if args.server:
+        from tts_server import TTSClient
+
+        health = TTSClient(args.server).health()
+        model_name, vad = health["model"], health["vad"]  # Part of the cache key
+        print(f"Server: {health['backend']} ({model_name}) on {health['device']}")
+
+    # Synthesized lines are stored once per cache key, and exposed by dialogue ID
+    # in lines/. The manifest maps each key to its output files, and the line
+    # manifest maps each dialogue ID to its file and position in the play.
+    cache_dir = f"{output_dir}/.cache"
+    manifest_path = f"{output_dir}/manifest.json"
+    journal_path = f"{output_dir}/journal.jsonl"
+
+    print(f"Using profile: {args.profile}")
+    print(f"Settings: {settings or 'default'}")
+    print(f"Output: {output_dir}")
+    if not args.dry_run:
+        os.makedirs(cache_dir, exist_ok=True)
+    previous_manifest = load_manifest(manifest_path)
+
+    print("Loading drama file...")
+    with contextlib.ExitStack() as stack:
+        with tts_trace.span("load_drama"):
+            drama = stack.enter_context(open_drama(args.drama, write_pack=not args.dry_run))
+        total_lines = sum(scene.line_count for act in drama.acts for scene in act.scenes)
+
+        # Collect every line first, so that models are only loaded if something changed
+        with tts_trace.span("collect_jobs"):
+            jobs, missing_voice = collect_jobs(drama, output_dir, settings, model_name, vad)
+    with tts_trace.span("find_pending"):
+        pending = find_pending_jobs(jobs, cache_dir, journal_path, args.verify, args.vad_buffer_ms, args.dry_run)
+    if args.dry_run:
+        print_plan(jobs, pending, missing_voice, total_lines)
+        return
+
+    for number, character in missing_voice:
+        print(f"[{number}/{total_lines}] Warning: No voice mapping for '{character}', skipping")
+    print(f"{len(jobs)} lines, {len(pending)} to synthesize")
+
+    if pending:
+        config = SynthesisConfig(args.backend, args.vad, cache_dir, settings, args.batch_size > 0,
+                                 args.vad_buffer_ms, args.vad_threads, args.profile, args.trace, args.server)
+        devices = args.devices.split(",") if args.devices else [args.device]
+        synthesize_jobs(list(pending.values()), config, args.batch_size, devices, args.workers,
+                        journal_path)
+
+    manifest: dict[str, list[str]] = {}
+    line_manifest: dict[str, dict] = {}
+    for job in jobs:
+        relative_path = os.path.relpath(job.output_path, output_dir)
+        manifest.setdefault(job.key, []).append(relative_path)
+        line_manifest[job.dialogue_id] = {"audio": relative_path, "act": job.act_idx,
+                                          "scene": job.scene_idx, "character": job.character}
+        if job.key not in pending and relative_path not in previous_manifest.get(job.key, []):
+            print(f"[{job.number}/{total_lines}] Act {job.act_idx}, Scene {job.scene_idx}: {job.character} (cached)")
+        with tts_trace.span("file_write", dialogue_id=job.dialogue_id):
+            os.makedirs(os.path.dirname(job.output_path), exist_ok=True)
+            place_cached_audio(f"{cache_dir}/{job.key}.wav", job.output_path)
 
-            filename = f"{line_idx:03d}_{character}.wav"
-            output_path = f"{scene_dir}/{filename}"
+    save_manifest(manifest_path, manifest)
+    save_line_manifest(output_dir, line_manifest)
+    removed = prune_line_audio(output_dir, line_manifest)
+    if removed:
+        print(f"Removed the audio of {len(removed)} deleted or edited lines")
 
-            print(f"[{current_line}/{total_lines}] Act {act_idx}, Scene {scene_idx}: {character} -> {speaker}")
-            print(f"    Text: {dialogue[:50]}{'...' if len(dialogue) > 50 else ''}")
+    print("Done!")
+    print(f"Output files in: {output_dir}/lines/, listed in {output_dir}/lines.json")
 
-            clean_dialogue = clean_text_for_tts(dialogue)
-            tts.tts_to_file(
-                text=clean_dialogue,
-                speaker=speaker,
-                language="fr",
-                file_path=output_path,
-                **TTS_SETTINGS,
-            )
+    if args.trace:
+        tts_trace.record_memory()
+        tts_trace.disable()
+        events = tts_trace.load_events([args.trace])
+        chrome_path = f"{os.path.splitext(args.trace)[0]}.chrome.json"
+        tts_trace.write_chrome_trace(events, chrome_path)
+        print(f"\n{tts_trace.summarize(events)}")
+        print(f"\nTrace in {args.trace}, and {chrome_path} for chrome://tracing")
 
-            # Trim trailing artifacts with VAD
-            trim_audio_with_vad(output_path, vad_model, get_speech_timestamps, read_audio, save_audio)
 
-print("Done!")
-print(f"Output files organized in: {OUTPUT_DIR}/act<N>/scene<N>/")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
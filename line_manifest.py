@@ -0,0 +1,46 @@
+"""Manifest of the audio of each dialogue, shared by generate_tts.py and generate_rehearsal.py.
+
+Audio is stored by dialogue ID (see drama.dialogue_id()), so that inserting or
+removing a line does not change the files of the other lines.
+"""
+import json
+import os
+
+LINE_MANIFEST_FILE = "lines.json"
+LINES_DIR = "lines"
+
+
+def line_audio_path(dialogue_id: str) -> str:
+    """Path of the audio of a dialogue, relative to the TTS output directory."""
+    return f"{LINES_DIR}/{dialogue_id}.wav"
+
+
+def load_line_manifest(tts_dir: str) -> dict[str, dict]:
+    """Load the line manifest (dialogue ID -> audio path and position), empty if missing."""
+    manifest_path = os.path.join(tts_dir, LINE_MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_line_manifest(tts_dir: str, manifest: dict[str, dict]) -> None:
+    """Write the line manifest atomically."""
+    manifest_path = os.path.join(tts_dir, LINE_MANIFEST_FILE)
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def prune_line_audio(tts_dir: str, manifest: dict[str, dict]) -> list[str]:
+    """Remove the audio of the dialogues that are not in the manifest anymore."""
+    lines_dir = os.path.join(tts_dir, LINES_DIR)
+    if not os.path.isdir(lines_dir):
+        return []
+    kept = {os.path.basename(entry["audio"]) for entry in manifest.values()}
+    removed = [os.path.join(lines_dir, filename) for filename in sorted(os.listdir(lines_dir))
+               if filename.endswith(".wav") and filename not in kept]
+    for path in removed:
+        os.remove(path)
+    return removed
@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+"""PrettyDrama command line: one subcommand per stage of the pipeline.
+
+    parse   Check a drama file: acts, scenes and lines of each character
+    plan    List the lines that "tts" would synthesize, take from the cache, or skip
+    tts     Synthesize the audio of every line (generate_tts.py)
+    trim    Re-trim an existing audio tree (trim_tts.py)
+    build   Build the rehearsal page (generate_rehearsal.py)
+    serve   Keep the TTS model loaded, for "tts --server" (tts_server.py)
+
+The options after plan, tts, trim, build and serve are those of the underlying script
+(see "prettydrama.py tts --help"). Each stage only imports what it needs, so
+parse and plan run without torch nor the TTS models.
+"""
+import argparse
+import importlib
+import sys
+
+# Subcommand -> module whose main() it runs, arguments put first, and help
+STAGES = {
+    "plan": ("generate_tts", ["--dry-run"], "List what tts would do"),
+    "tts": ("generate_tts", [], "Synthesize the audio"),
+    "trim": ("trim_tts", [], "Re-trim an audio tree"),
+    "build": ("generate_rehearsal", [], "Build the rehearsal page"),
+    "serve": ("tts_server", [], "Run a TTS server"),
+}
+
+
+def parse(drama_txt: str, previous_txt: str | None) -> None:
+    """Print the structure of a drama file, or its changes since a previous version."""
+    from drama import print_changes
+    from drama_pack import open_drama
+
+    if previous_txt:
+        # Numbered as recorded next to the previous version, if it was built
+        with open_drama(previous_txt, write_pack=False) as previous:
+            print_changes(previous, drama_txt)
+        return
+
+    lines_per_character: dict[str, int] = {}
+    with open_drama(drama_txt, write_pack=False) as drama:
+        print(drama.title)
+        for act_idx, act in enumerate(drama.acts, start=1):
+            for scene_idx, scene in enumerate(act.scenes, start=1):
+                names = sorted(character.name for character in scene.characters)
+                print(f"Act {act_idx}, Scene {scene_idx}: {scene.line_count} lines ({', '.join(names)})")
+                for dialogue in scene.dialogues:
+                    name = dialogue.character.name
+                    lines_per_character[name] = lines_per_character.get(name, 0) + 1
+    for name, count in sorted(lines_per_character.items(), key=lambda item: -item[1]):
+        print(f"{count:>6}  {name}")
+    print(f"{sum(lines_per_character.values())} lines, {len(lines_per_character)} characters")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="prettydrama", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    parse_parser = subparsers.add_parser("parse", help="Check a drama file")
+    parse_parser.add_argument("drama_txt")
+    parse_parser.add_argument("--previous", help="Instead, list the dialogues changed since this version")
+    for command, (_, _, stage_help) in STAGES.items():
+        # --help is left to the script itself
+        subparsers.add_parser(command, add_help=False, help=stage_help)
+    args, stage_args = parser.parse_known_args()
+
+    if args.command == "parse":
+        if stage_args:
+            parser.error(f"unrecognized arguments: {' '.join(stage_args)}")
+        parse(args.drama_txt, args.previous)
+        return
+
+    module, first_args, _ = STAGES[args.command]
+    sys.argv = [f"prettydrama {args.command}", *first_args, *stage_args]
+    importlib.import_module(module).main()
+
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,14 @@ docker run --rm --gpus all \
   -v $PWD/vad-models-cache:/root/.cache/torch/hub \
   -v $PWD/generate_tts.py:/root/generate_tts.py \
   -v $PWD/drama.py:/root/drama.py \
+  -v $PWD/drama_pack.py:/root/drama_pack.py \
+  -v $PWD/tts_backends.py:/root/tts_backends.py \
+  -v $PWD/tts_trace.py:/root/tts_trace.py \
+  -v $PWD/trim_tts.py:/root/trim_tts.py \
+  -v $PWD/wav_files.py:/root/wav_files.py \
+  -v $PWD/line_manifest.py:/root/line_manifest.py \
   -v $PWD/full_drama.txt:/root/full_drama.txt \
+  -v $PWD/full_drama.txt.numbers.jsonl:/root/full_drama.txt.numbers.jsonl \
   --entrypoint python3 \
   ghcr.io/coqui-ai/tts \
   -u /root/generate_tts.py
\ No newline at end of file
@@ -0,0 +1,18 @@
+docker run --rm --gpus all \
+  -e COQUI_TOS_AGREED=1 \
+  -e PYTHONUNBUFFERED=1 \
+  -p 127.0.0.1:8765:8765 \
+  -v $PWD/tts-models-cache:/root/.local/share/tts \
+  -v $PWD/vad-models-cache:/root/.cache/torch/hub \
+  -v $PWD/tts_server.py:/root/tts_server.py \
+  -v $PWD/generate_tts.py:/root/generate_tts.py \
+  -v $PWD/drama.py:/root/drama.py \
+  -v $PWD/drama_pack.py:/root/drama_pack.py \
+  -v $PWD/tts_backends.py:/root/tts_backends.py \
+  -v $PWD/tts_trace.py:/root/tts_trace.py \
+  -v $PWD/trim_tts.py:/root/trim_tts.py \
+  -v $PWD/wav_files.py:/root/wav_files.py \
+  -v $PWD/line_manifest.py:/root/line_manifest.py \
+  --entrypoint python3 \
+  ghcr.io/coqui-ai/tts \
+  -u /root/tts_server.py --host 0.0.0.0
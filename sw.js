@@ -0,0 +1,110 @@
+// Generated by generate_rehearsal.py
+const VERSION = "5c8b2ba8657e18b4";
+const SHELL_CACHE = `prettydrama-shell-${VERSION}`;
+const AUDIO_CACHE = "prettydrama-audio";  // Kept across versions, entries are keyed by content hash
+const MANIFEST_URL = "precache-manifest.json";
+
+let manifestPromise = null;
+
+function getManifest() {
+    if (!manifestPromise) {
+        manifestPromise = caches.open(SHELL_CACHE)
+            .then(cache => cache.match(MANIFEST_URL))
+            .then(response => response || fetch(MANIFEST_URL))
+            .then(response => response.json());
+        manifestPromise.catch(() => { manifestPromise = null; });
+    }
+    return manifestPromise;
+}
+
+// URL relative to the page, as written in the precache manifest
+function assetPath(url) {
+    const scope = self.registration.scope;
+    if (!url.startsWith(scope)) return null;
+    return decodeURIComponent(url.slice(scope.length).split(/[?#]/)[0]);
+}
+
+function cacheKey(path, hash) {
+    return new URL(`${path}?v=${hash}`, self.registration.scope).href;
+}
+
+// <audio> elements ask for byte ranges, which Safari requires to be answered with a 206
+async function rangeResponse(response, range) {
+    const match = /^bytes=(\d*)-(\d*)$/.exec(range);
+    const data = await response.arrayBuffer();
+    if (!match) return new Response(data, { headers: response.headers });
+    let start = match[1] === "" ? data.byteLength - Number(match[2]) : Number(match[1]);
+    let end = match[1] !== "" && match[2] !== "" ? Number(match[2]) : data.byteLength - 1;
+    start = Math.max(0, start);
+    end = Math.min(end, data.byteLength - 1);
+    return new Response(data.slice(start, end + 1), {
+        status: 206,
+        headers: {
+            "Content-Type": response.headers.get("Content-Type") || "application/octet-stream",
+            "Content-Range": `bytes ${start}-${end}/${data.byteLength}`,
+            "Content-Length": String(end - start + 1),
+        },
+    });
+}
+
+self.addEventListener("install", event => {
+    event.waitUntil(caches.open(SHELL_CACHE)
+        .then(cache => cache.addAll(["./", MANIFEST_URL].map(url => new Request(url, { cache: "reload" }))))
+        .then(() => self.skipWaiting()));
+});
+
+self.addEventListener("activate", event => {
+    event.waitUntil((async () => {
+        for (const name of await caches.keys()) {
+            if (name.startsWith("prettydrama-shell-") && name !== SHELL_CACHE) await caches.delete(name);
+        }
+        // Only drop the audio whose content changed or that no longer exists
+        const manifest = await getManifest();
+        const cache = await caches.open(AUDIO_CACHE);
+        for (const request of await cache.keys()) {
+            const path = assetPath(request.url);
+            const hash = new URL(request.url).searchParams.get("v");
+            if (!path || manifest.assets[path] !== hash) await cache.delete(request);
+        }
+        await self.clients.claim();
+    })());
+});
+
+self.addEventListener("fetch", event => {
+    const request = event.request;
+    if (request.method !== "GET" || !request.url.startsWith(self.registration.scope)) return;
+
+    if (request.mode === "navigate") {
+        // Network first, so that a rebuilt page shows up as soon as it is online
+        event.respondWith(fetch(request)
+            .then(response => {
+                const copy = response.clone();
+                if (response.ok) caches.open(SHELL_CACHE).then(cache => cache.put("./", copy));
+                return response;
+            })
+            .catch(() => caches.match("./", { cacheName: SHELL_CACHE })));
+        return;
+    }
+
+    event.respondWith((async () => {
+        let manifest;
+        try {
+            manifest = await getManifest();
+        } catch (e) {
+            return fetch(request);
+        }
+        const path = assetPath(request.url);
+        const hash = path && manifest.assets[path];
+        if (!hash) return fetch(request);
+
+        const cache = await caches.open(AUDIO_CACHE);
+        const key = cacheKey(path, hash);
+        const cached = await cache.match(key);
+        const range = request.headers.get("range");
+        if (cached) return range ? rangeResponse(cached, range) : cached;
+
+        const response = await fetch(request);
+        if (!range && response.status === 200) cache.put(key, response.clone());
+        return response;
+    })());
+});
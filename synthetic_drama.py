@@ -0,0 +1,139 @@
+#!/usr/bin/python3
+"""Write a synthetic play, and optionally a placeholder audio tree, for scaling tests.
+
+The defaults match the size of full_drama.txt: one act of ten scenes of about
+115 lines, spoken by ten characters. --scale multiplies the number of acts.
+The placeholder audio tree has the layout written by generate_tts.py (lines/
+and lines.json), with every line pointing to the same short silent WAV.
+"""
+import argparse
+import math
+import os
+import random
+import shutil
+import time
+import wave
+
+from drama import Drama
+from line_manifest import LINES_DIR, line_audio_path, save_line_manifest
+
+CAST = ["Annie", "Serge", "Charlotte", "Napo", "Sarah", "Catherine", "Marthe", "Tim", "Docteur", "Capitaine",
+        "Louise", "Paul", "Jeanne", "Marcel", "Lucie", "Henri", "Odette", "Gaston", "Simone", "Lucien"]
+WORDS = ("on va pas y aller mais qui c'est celle là faut toujours qu'il en ait une silence moi le chef ici "
+         "tu sais plus où te mettre dans ce rafiot deux semaines pire qu'un marché l'air pur avait pas "
+         "d'odeur arriver sentir profiter parle pour toi cause toujours mon cœur bateau mer capitaine "
+         "docteur malade voyage mourir rien fait demander joli petit nom étouffe bestiaux vaches").split()
+PLACEHOLDER_SAMPLE_RATE = 24000
+PLACEHOLDER_SECONDS = 0.5
+
+
+def cast_names(n_characters: int) -> list[str]:
+    """The first names of CAST, then numbered characters."""
+    return CAST[:n_characters] + [f"Personnage {idx}" for idx in range(len(CAST) + 1, n_characters + 1)]
+
+
+def random_sentence(rng: random.Random, words_mean: float, words_sigma: float) -> str:
+    """A sentence whose number of words follows a log-normal distribution of the given mean."""
+    mu = math.log(words_mean) - words_sigma ** 2 / 2
+    n_words = max(1, round(rng.lognormvariate(mu, words_sigma)))
+    sentence = " ".join(rng.choice(WORDS) for _ in range(n_words))
+    return sentence[0].upper() + sentence[1:] + rng.choice([".", ".", ".", "!", " ?", "..."])
+
+
+def generate_script(n_acts: int, scenes_per_act: int, lines_per_scene: int, n_characters: int,
+                    scene_cast: int, words_mean: float, words_sigma: float, multiline: float,
+                    seed: int) -> list[str]:
+    """Lines of a synthetic play in the drama format.
+
+    Each scene draws scene_cast characters, the first of the cast speaking most
+    (weights 1/rank). A dialogue continues on 1 to 3 more lines with probability multiline.
+    """
+    rng = random.Random(seed)
+    names = cast_names(n_characters)
+    weights = [1 / rank for rank in range(1, n_characters + 1)]
+
+    lines = [f"Pièce synthétique ({n_acts} actes, {n_acts * scenes_per_act * lines_per_scene} répliques)"]
+    for _ in range(n_acts):
+        lines.append("==========Act==========")
+        for _ in range(scenes_per_act):
+            lines.append("***Scene***")
+            present = sorted(rng.sample(range(n_characters), min(scene_cast, n_characters)))
+            present_weights = [weights[idx] for idx in present]
+            previous = None
+            for _ in range(lines_per_scene):
+                speaker = rng.choices(present, present_weights)[0]
+                if speaker == previous and len(present) > 1:  # Characters rarely answer themselves
+                    speaker = rng.choices(present, present_weights)[0]
+                previous = speaker
+                lines.append(f"<{names[speaker]}> {random_sentence(rng, words_mean, words_sigma)}")
+                if rng.random() < multiline:
+                    lines.extend(random_sentence(rng, words_mean, words_sigma) for _ in range(rng.randint(1, 3)))
+    return lines
+
+
+def write_placeholder_audio(drama: Drama, tts_dir: str) -> int:
+    """Write a tts-output tree where every line is a hard link to one silent WAV.
+
+    Return the number of lines.
+    """
+    os.makedirs(os.path.join(tts_dir, LINES_DIR), exist_ok=True)
+    silence_path = os.path.join(tts_dir, "silence.wav")
+    with wave.open(silence_path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(PLACEHOLDER_SAMPLE_RATE)
+        f.writeframes(bytes(2 * int(PLACEHOLDER_SAMPLE_RATE * PLACEHOLDER_SECONDS)))
+
+    line_manifest: dict[str, dict] = {}
+    for act_idx, act in enumerate(drama.acts, start=1):
+        for scene_idx, scene in enumerate(act.scenes, start=1):
+            for dialogue_id, dialogue in zip(scene.ids, scene.dialogues):
+                relative_path = line_audio_path(dialogue_id)
+                output_path = os.path.join(tts_dir, relative_path)
+                if not os.path.exists(output_path):
+                    try:
+                        os.link(silence_path, output_path)
+                    except OSError:  # No hard links on this file system
+                        shutil.copyfile(silence_path, output_path)
+                line_manifest[dialogue_id] = {"audio": relative_path, "act": act_idx, "scene": scene_idx,
+                                              "character": dialogue.character.name}
+    save_line_manifest(tts_dir, line_manifest)
+    return len(line_manifest)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output_txt")
+    parser.add_argument("--scale", type=int, default=1, help="Multiplies the number of acts")
+    parser.add_argument("--acts", type=int, default=1)
+    parser.add_argument("--scenes-per-act", type=int, default=10)
+    parser.add_argument("--lines-per-scene", type=int, default=115)
+    parser.add_argument("--cast", type=int, default=10, help="Number of characters in the play")
+    parser.add_argument("--scene-cast", type=int, default=7, help="Number of characters in each scene")
+    parser.add_argument("--words-mean", type=float, default=9, help="Mean number of words per line")
+    parser.add_argument("--words-sigma", type=float, default=0.7, help="Spread of the log-normal line lengths")
+    parser.add_argument("--multiline", type=float, default=0.05,
+                        help="Probability that a dialogue continues on the next lines")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--audio-dir", help="Also write a placeholder tts-output tree there")
+    args = parser.parse_args()
+
+    lines = generate_script(args.acts * args.scale, args.scenes_per_act, args.lines_per_scene, args.cast,
+                            args.scene_cast, args.words_mean, args.words_sigma, args.multiline, args.seed)
+    with open(args.output_txt, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    print(f"Wrote {args.output_txt}: {len(lines)} lines, {os.path.getsize(args.output_txt)} bytes")
+
+    start = time.perf_counter()
+    drama = Drama.from_file(args.output_txt)
+    n_dialogues = sum(scene.line_count for act in drama.acts for scene in act.scenes)
+    print(f"Parsed {n_dialogues} dialogues in {time.perf_counter() - start:.2f} s")
+
+    if args.audio_dir:
+        n_lines = write_placeholder_audio(drama, args.audio_dir)
+        print(f"Wrote placeholder audio for {n_lines} lines in {args.audio_dir}/")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Tests of the parser and incremental re-parse of drama.py, and of the numbering kept by drama_pack.py."""
+from drama import Drama, iter_dialogues, iter_scenes, reparse
+from drama_pack import load_drama
+
+
+def scene_lines(*dialogues: str) -> list[str]:
+    return ["Title", "==========Act==========", "***Scene***", *dialogues]
+
+
+def locations(changes) -> list[tuple[int, str]]:
+    return [(change.number, change.character) for change in changes]
+
+
+def test_unchanged_lines_keep_their_numbers():
+    previous = Drama.from_lines(scene_lines("<A> one", "<B> two", "<A> three"))
+    drama, diff = reparse(previous, scene_lines("<A> zero", "<A> one", "<B> two", "<A> three"))
+    assert drama.acts[0].scenes[0].numbers == [4, 1, 2, 3]
+    assert locations(diff.added) == [(4, "A")]
+    assert not diff.removed and not diff.edited and not diff.renumbered
+
+
+def test_insertion_next_to_an_edit_is_added():
+    previous = Drama.from_lines(scene_lines("<A> one", "<B> two", "<A> three"))
+    drama, diff = reparse(previous, scene_lines("<A> one", "<X> inserted", "<B> two edited", "<A> three"))
+    assert drama.acts[0].scenes[0].numbers == [1, 4, 2, 3]
+    assert locations(diff.added) == [(4, "X")]
+    assert locations(diff.edited) == [(2, "B")]
+    assert not diff.removed
+
+
+def test_rewritten_line_is_removed_and_added():
+    previous = Drama.from_lines(scene_lines("<A> one", "<B> Bonjour tout le monde", "<A> three"))
+    _, diff = reparse(previous, scene_lines("<A> one", "<B> Non.", "<A> three"))
+    assert locations(diff.removed) == [(2, "B")]
+    assert locations(diff.added) == [(4, "B")]
+    assert not diff.edited
+
+
+def test_edit_by_another_character_is_not_paired():
+    previous = Drama.from_lines(scene_lines("<A> one", "<B> two", "<A> three"))
+    _, diff = reparse(previous, scene_lines("<A> one", "<C> two", "<A> three"))
+    assert locations(diff.removed) == [(2, "B")]
+    assert locations(diff.added) == [(4, "C")]
+
+
+def test_line_moved_to_another_scene_is_renumbered():
+    previous = Drama.from_lines(scene_lines("<A> one", "<B> two", "***Scene***", "<C> three"))
+    drama, diff = reparse(previous, scene_lines("<A> one", "***Scene***", "<B> two", "<C> three"))
+    assert drama.acts[0].scenes[1].numbers == [2, 1]
+    assert [(change.scene_idx, change.number, change.previous) for change in diff.renumbered] == [(2, 2, (1, 1, 2))]
+
+
+def test_repeated_lines_are_matched_in_order():
+    previous = Drama.from_lines(scene_lines("<A> yes", "<B> no", "<A> yes"))
+    drama, diff = reparse(previous, scene_lines("<A> yes", "<B> no", "<B> no", "<A> yes"))
+    assert drama.acts[0].scenes[0].numbers == [1, 2, 4, 3]
+    assert locations(diff.added) == [(4, "B")]
+
+
+def test_number_of_a_deleted_line_is_not_reused():
+    previous = Drama.from_lines(scene_lines("<A> one", "<B> two", "<A> three"))
+    drama, _ = reparse(previous, scene_lines("<A> one", "<B> two"))
+    assert drama.acts[0].scenes[0].next_number == 4
+    drama, diff = reparse(drama, scene_lines("<A> one", "<B> two", "<C> four"))
+    assert drama.acts[0].scenes[0].numbers == [1, 2, 4]
+    assert locations(diff.added) == [(4, "C")]
+
+
+def test_numbering_persists_across_edits(tmp_path):
+    drama_txt = tmp_path / "drama.txt"
+    versions = [
+        scene_lines("<A> one", "<B> two", "<A> three"),
+        scene_lines("<A> one", "<X> inserted", "<B> two edited", "<A> three"),
+        scene_lines("<X> inserted", "<B> two edited", "<A> three"),
+    ]
+    expected = [[1, 2, 3], [1, 4, 2, 3], [4, 2, 3]]
+    for lines, numbers in zip(versions, expected):
+        drama_txt.write_text("\n".join(lines) + "\n")
+        drama = load_drama(str(drama_txt))
+        assert drama.acts[0].scenes[0].numbers == numbers
+        if hasattr(drama, "close"):
+            drama.close()
+
+    packed = load_drama(str(drama_txt))  # Up to date: the packed copy itself
+    assert packed.acts[0].scenes[0].numbers == [4, 2, 3]
+    packed.close()
+
+
+def test_numbering_persists_without_the_pack(tmp_path):
+    drama_txt = tmp_path / "drama.txt"
+    versions = [
+        scene_lines("<A> one", "<B> two", "<A> three"),
+        scene_lines("<A> one", "<B> two"),
+        scene_lines("<X> zero", "<A> one", "<B> two"),
+    ]
+    expected = [[1, 2, 3], [1, 2], [4, 1, 2]]
+    for lines, numbers in zip(versions, expected):
+        drama_txt.write_text("\n".join(lines) + "\n")
+        (tmp_path / "drama.txt.pack").unlink(missing_ok=True)  # As in a fresh clone
+        drama = load_drama(str(drama_txt))
+        assert drama.acts[0].scenes[0].numbers == numbers
+    assert (tmp_path / "drama.txt.numbers.jsonl").exists()
+
+
+def test_read_only_load_does_not_write_the_pack(tmp_path):
+    drama_txt = tmp_path / "drama.txt"
+    drama_txt.write_text("\n".join(scene_lines("<A> one")) + "\n")
+    load_drama(str(drama_txt), write_pack=False)
+    assert not (tmp_path / "drama.txt.pack").exists()
+    assert not (tmp_path / "drama.txt.numbers.jsonl").exists()
+
+
+def test_truncated_pack_is_parsed_again(tmp_path):
+    drama_txt = tmp_path / "drama.txt"
+    drama_txt.write_text("\n".join(scene_lines("<A> one", "<B> two")) + "\n")
+    load_drama(str(drama_txt))  # Parsed, and packed
+    pack = tmp_path / "drama.txt.pack"
+    pack.write_bytes(pack.read_bytes()[:4])
+    drama = load_drama(str(drama_txt))
+    assert drama.acts[0].scenes[0].numbers == [1, 2]
+    assert pack.stat().st_size > 4
+
+
+def test_scenes_and_dialogues_stream_from_a_file(tmp_path):
+    drama_txt = tmp_path / "drama.txt"
+    drama_txt.write_text("\n".join(scene_lines("<A> one", "***Scene***", "<B> two ", "==========Act==========",
+                                               "<C> three")) + "\n")
+    with open(drama_txt) as file:
+        next(file)  # Title
+        assert [(act_idx, scene_idx, scene.numbers) for act_idx, scene_idx, scene in iter_scenes(file, 2)] == [
+            (1, 1, [1]), (1, 2, [1]), (2, 1, [1])]
+    with open(drama_txt) as file:
+        next(file)
+        assert [(act_idx, scene_idx, dialogue.text) for act_idx, scene_idx, dialogue in iter_dialogues(file, 2)] == [
+            (1, 1, "one"), (1, 2, "two"), (2, 1, "three")]
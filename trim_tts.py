@@ -0,0 +1,313 @@
+#!/usr/bin/python3
+"""Trim trailing silence/artifacts of TTS audio with VAD.
+
+Run as a script to re-trim an existing tts-output tree, without re-synthesizing.
+"""
+import argparse
+import functools
+import os
+import queue
+import threading
+import traceback
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable
+
+import torch
+import torchaudio
+
+import tts_trace
+from wav_files import find_wav_files
+
+VAD_SAMPLE_RATE = 16000  # Silero VAD requires 16kHz
+
+
+def load_vad_model():
+    """Load Silero VAD model."""
+    model, utils = torch.hub.load(
+        repo_or_dir='snakers4/silero-vad',
+        model='silero_vad',
+        force_reload=False,
+        trust_repo=True,
+    )
+    return model, utils
+
+
+def energy_speech_timestamps(audio: torch.Tensor, model=None, sampling_rate: int = 16000,
+                             threshold: float = 0.05, frame_ms: int = 30) -> list[dict]:
+    """Offline stand-in for Silero's get_speech_timestamps(), based on frame energy.
+
+    A frame is speech when its RMS is above threshold times the loudest frame RMS.
+    """
+    frame_size = int(sampling_rate * frame_ms / 1000)
+    n_frames = audio.shape[-1] // frame_size
+    if n_frames == 0:
+        return []
+
+    frames = audio[:n_frames * frame_size].reshape(n_frames, frame_size)
+    rms = frames.pow(2).mean(dim=1).sqrt()
+    is_speech = rms > threshold * rms.max().clamp(min=1e-6)
+
+    timestamps: list[dict] = []
+    for frame_idx, speech in enumerate(is_speech.tolist()):
+        if not speech:
+            continue
+        start, end = frame_idx * frame_size, (frame_idx + 1) * frame_size
+        if timestamps and timestamps[-1]["end"] == start:
+            timestamps[-1]["end"] = end
+        else:
+            timestamps.append({"start": start, "end": end})
+    return timestamps
+
+
+def load_vad(name: str):
+    """Return (vad_model, get_speech_timestamps) for "silero" or "energy"."""
+    if name == "silero":
+        vad_model, vad_utils = load_vad_model()
+        return vad_model, vad_utils[0]
+    if name == "energy":
+        return None, energy_speech_timestamps
+    raise ValueError(f"Unknown VAD: {name}")
+
+
+@functools.lru_cache(maxsize=None)
+def get_resampler(orig_freq: int, new_freq: int) -> torchaudio.transforms.Resample:
+    """Resampling kernels are expensive to build, so build them once per rate pair."""
+    return torchaudio.transforms.Resample(orig_freq, new_freq)
+
+
+def to_pcm16(wav: torch.Tensor) -> torch.Tensor:
+    """Convert a float waveform to 16-bit PCM, normalized like Coqui's save_wav()."""
+    return (wav * (32767 / max(0.01, wav.abs().max().item()))).to(torch.int16)
+
+
+def write_wav(path: str, pcm: torch.Tensor, sample_rate: int) -> None:
+    """Write a 1D 16-bit PCM waveform."""
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(pcm.numpy().tobytes())
+
+
+def trim_waveforms_with_vad(wavs: list[torch.Tensor], sr: int, vad_model, get_speech_timestamps,
+                            buffer_ms: int = 150) -> list[torch.Tensor]:
+    """Trim trailing silence/artifacts of 1D waveforms using VAD.
+
+    The waveforms are zero-padded and resampled to 16kHz in a single call, then
+    speech is detected in each of them. Works on float or 16-bit PCM waveforms,
+    the trimmed waveforms keep their dtype.
+    """
+    if not wavs:
+        return []
+    wavs_float = [wav.float() / 32768 if wav.dtype == torch.int16 else wav for wav in wavs]
+    with tts_trace.span("vad_resample", lines=len(wavs), sample_rate=sr):
+        batch = torch.nn.utils.rnn.pad_sequence(wavs_float, batch_first=True)
+        if sr != VAD_SAMPLE_RATE:
+            batch_16k = get_resampler(sr, VAD_SAMPLE_RATE)(batch)
+        else:
+            batch_16k = batch
+
+    trimmed: list[torch.Tensor] = []
+    for wav, wav_16k in zip(wavs, batch_16k):
+        length_16k = -(-wav.shape[-1] * VAD_SAMPLE_RATE // sr)
+
+        # Get speech timestamps
+        with tts_trace.span("vad_detect", samples=length_16k):
+            speech_timestamps = get_speech_timestamps(wav_16k[:length_16k], vad_model,
+                                                      sampling_rate=VAD_SAMPLE_RATE)
+
+        if not speech_timestamps:
+            trimmed.append(wav)  # No speech detected, keep original
+            continue
+
+        # Find end of last speech segment
+        last_speech_end = speech_timestamps[-1]['end']
+
+        # Convert back to original sample rate and add buffer
+        buffer_samples = int(buffer_ms * sr / 1000)
+        end_sample_orig = int(last_speech_end * sr / VAD_SAMPLE_RATE) + buffer_samples
+        end_sample_orig = min(end_sample_orig, wav.shape[-1])
+
+        trimmed.append(wav[:end_sample_orig])
+    return trimmed
+
+
+def trim_waveform_with_vad(wav: torch.Tensor, sr: int, vad_model, get_speech_timestamps,
+                           buffer_ms: int = 150) -> torch.Tensor:
+    """Trim trailing silence/artifacts of a 1D waveform using VAD."""
+    return trim_waveforms_with_vad([wav], sr, vad_model, get_speech_timestamps, buffer_ms)[0]
+
+
+def trim_audio_with_vad(audio_path: str, vad_model, get_speech_timestamps, buffer_ms: int = 150) -> bool:
+    """Trim trailing silence/artifacts of a WAV file in place, keeping its sample format.
+
+    Return whether the file was shortened.
+    """
+    wav, sr = torchaudio.load(audio_path, normalize=False)
+    trimmed = trim_waveform_with_vad(wav[0], sr, vad_model, get_speech_timestamps, buffer_ms)
+    if trimmed.shape[-1] == wav.shape[-1]:
+        return False
+    tmp_path = f"{os.path.splitext(audio_path)[0]}.tmp.wav"
+    torchaudio.save(tmp_path, trimmed.unsqueeze(0), sr)
+    os.replace(tmp_path, audio_path)
+    return True
+
+
+@dataclass
+class TrimTask:
+    """A synthesized waveform to trim and write to output_path."""
+    pcm: torch.Tensor  # 1D 16-bit PCM
+    sample_rate: int
+    output_path: str
+    payload: object = None  # Handed back to on_done
+
+
+class TrimStage:
+    """Pipeline stage running VAD trimming and file writes on background threads.
+
+    Synthesis submits waveforms into a bounded queue, and keeps the GPU busy
+    while the threads trim them in batches. Each file is written under a
+    temporary name then renamed, and on_done(task) is called (one call at a
+    time) once it is in place.
+    """
+
+    def __init__(self, vad: str, buffer_ms: int, on_done: Callable[[TrimTask], None],
+                 n_threads: int = 1, batch_size: int = 8, max_queued: int = 32):
+        self.vad = vad
+        self.buffer_ms = buffer_ms
+        self.on_done = on_done
+        self.batch_size = batch_size
+        self.tasks: queue.Queue = queue.Queue(maxsize=max_queued)
+        self.lock = threading.Lock()
+        self.errors: list[str] = []
+        self.threads = [threading.Thread(target=self._run, daemon=True) for _ in range(n_threads)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, task: TrimTask) -> None:
+        """Queue a waveform, blocking while the queue is full."""
+        self._raise_errors()
+        self.tasks.put(task)
+
+    def close(self) -> None:
+        """Wait until every queued waveform is written."""
+        for _ in self.threads:
+            self.tasks.put(None)
+        for thread in self.threads:
+            thread.join()
+        self._raise_errors()
+
+    def _raise_errors(self) -> None:
+        if self.errors:
+            raise RuntimeError(f"VAD trimming failed:\n{self.errors[0]}")
+
+    def _run(self) -> None:
+        try:
+            # Silero keeps an internal state, so each thread gets its own model
+            with self.lock, tts_trace.span("vad_load", vad=self.vad):
+                vad_model, get_speech_timestamps = load_vad(self.vad)
+
+            running = True
+            while running:
+                batch = [self.tasks.get()]
+                while batch[-1] is not None and len(batch) < self.batch_size and not self.tasks.empty():
+                    batch.append(self.tasks.get())
+                if batch[-1] is None:  # Each thread consumes exactly one None
+                    running = False
+                    batch = [task for task in batch if task is not None]
+                self._process(batch, vad_model, get_speech_timestamps)
+        except Exception:
+            self.errors.append(traceback.format_exc())
+            # Keep consuming, so that submit() never blocks forever
+            while self.tasks.get() is not None:
+                pass
+
+    def _process(self, batch: list[TrimTask], vad_model, get_speech_timestamps) -> None:
+        for sample_rate in {task.sample_rate for task in batch}:
+            tasks = [task for task in batch if task.sample_rate == sample_rate]
+            trimmed = trim_waveforms_with_vad([task.pcm for task in tasks], sample_rate, vad_model,
+                                              get_speech_timestamps, self.buffer_ms)
+            for task, pcm in zip(tasks, trimmed):
+                with tts_trace.span("trim_write", samples=pcm.shape[-1]):
+                    tmp_path = f"{os.path.splitext(task.output_path)[0]}.tmp.wav"
+                    write_wav(tmp_path, pcm, sample_rate)
+                    os.replace(tmp_path, task.output_path)
+                with self.lock:
+                    self.on_done(task)
+
+
+_worker_vad = None
+
+
+def _init_retrim_worker(vad: str) -> None:
+    global _worker_vad
+    torch.set_num_threads(1)  # Parallelism comes from the processes
+    _worker_vad = load_vad(vad)
+
+
+def _retrim_file(path: str, buffer_ms: int) -> bool:
+    vad_model, get_speech_timestamps = _worker_vad
+    return trim_audio_with_vad(path, vad_model, get_speech_timestamps, buffer_ms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-trim an existing tts-output tree in parallel.")
+    parser.add_argument("tts_dir", nargs="?", default="tts-output")
+    parser.add_argument("--buffer-ms", type=int, default=150,
+                        help="Audio kept after the end of speech. Trimming only removes audio: "
+                             "a buffer larger than the one used at generation can't restore it")
+    parser.add_argument("--vad", default="silero", choices=["silero", "energy"])
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    from generate_tts import VAD_BUFFER_MS, append_journal, load_journal, load_manifest, place_cached_audio
+
+    # Outputs of generate_tts.py are links to its cache: the cache entries are
+    # trimmed instead, or the next run would expose the untrimmed audio again.
+    cache_dir = os.path.join(args.tts_dir, ".cache")
+    manifest = load_manifest(os.path.join(args.tts_dir, "manifest.json"))
+    linked = {os.path.join(args.tts_dir, output) for outputs in manifest.values() for output in outputs}
+    cache_paths = sorted(os.path.join(cache_dir, name) for name in os.listdir(cache_dir)
+                         if name.endswith(".wav") and not name.endswith(".tmp.wav")) \
+        if os.path.isdir(cache_dir) else []
+    paths = cache_paths + [path for path in find_wav_files(args.tts_dir) if path not in linked]
+    print(f"Re-trimming {len(paths)} files with a {args.buffer_ms} ms buffer...")
+
+    n_trimmed = 0
+    trimmed_keys: dict[str, bool] = {}  # Cache key -> whether its file was shortened
+    with ProcessPoolExecutor(args.workers, initializer=_init_retrim_worker, initargs=(args.vad,)) as pool:
+        for current, (path, was_trimmed) in enumerate(
+                zip(paths, pool.map(_retrim_file, paths, [args.buffer_ms] * len(paths), chunksize=8)),
+                start=1):
+            n_trimmed += was_trimmed
+            if was_trimmed:
+                print(f"[{current}/{len(paths)}] Trimmed {path}")
+            if current <= len(cache_paths):
+                trimmed_keys[os.path.splitext(os.path.basename(path))[0]] = was_trimmed
+
+    # The journal records the new lengths and buffers (its last entry of a key
+    # wins), which generate_tts.py checks against its --vad-buffer-ms. A larger
+    # buffer can't restore audio: the entry keeps the smaller one. The outputs
+    # are linked to the new cache files.
+    journal_path = os.path.join(args.tts_dir, "journal.jsonl")
+    journal = load_journal(journal_path)
+    if trimmed_keys:
+        with open(journal_path, "a", encoding="utf-8") as journal_file:
+            for key, was_trimmed in trimmed_keys.items():
+                previous_buffer_ms = journal.get(key, {}).get("vad_buffer_ms", VAD_BUFFER_MS)
+                buffer_ms = min(previous_buffer_ms, args.buffer_ms)
+                if not was_trimmed and buffer_ms == previous_buffer_ms and key in journal:
+                    continue
+                cache_path = os.path.join(cache_dir, f"{key}.wav")
+                append_journal(journal_file, key, cache_path, buffer_ms)
+                if was_trimmed:
+                    for output in manifest.get(key, []):
+                        place_cached_audio(cache_path, os.path.join(args.tts_dir, output))
+
+    print(f"Done! {n_trimmed} files trimmed.")
+
+
+if __name__ == "__main__":
+    main()
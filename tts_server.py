@@ -0,0 +1,276 @@
+#!/usr/bin/python3
+"""Long-running TTS service keeping the model and the VAD loaded, over localhost HTTP.
+
+    GET  /health      Backend, model, sample rate, uptime
+    GET  /metrics     Requests, lines, batch sizes, queue depth, real-time factor, memory
+    POST /synthesize  {"lines": [{"text", "speaker"}], "language", "settings", "vad_buffer_ms"}
+                      -> {"lines": [{"wav": base64 16-bit PCM WAV, trimmed with VAD}]}
+
+Lines of concurrent requests that share a speaker and settings can be passed
+to the backend together, in batches of up to --batch-size lines (1 by
+default), waiting at most --batch-wait-ms for a batch to fill. XTTS still
+synthesizes a batch line by line. Run generate_tts.py with --server to
+synthesize through it. TTSClient only needs the standard library, so clients
+don't import torch.
+"""
+import argparse
+import base64
+import collections
+import io
+import json
+import resource
+import threading
+import time
+import traceback
+import urllib.error
+import urllib.request
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PORT = 8765
+
+
+@dataclass
+class LineRequest:
+    """A line waiting in the batcher. Its future gets the WAV bytes."""
+    text: str
+    speaker: str
+    language: str
+    settings: dict
+    vad_buffer_ms: int
+    queued_at: float = field(default_factory=time.monotonic)
+    future: Future = field(default_factory=Future)
+
+    @property
+    def group(self) -> tuple:
+        """Lines of the same group can be synthesized in one batch."""
+        return (self.speaker, self.language, json.dumps(self.settings, sort_keys=True), self.vad_buffer_ms)
+
+
+class TTSService:
+    """Resident backend and VAD, fed by a batcher thread from the queued lines of every request."""
+
+    def __init__(self, backend_name: str, model_name: str, device: str, vad: str,
+                 batch_size: int, batch_wait_ms: float):
+        from trim_tts import load_vad
+        from tts_backends import load_backend
+
+        self.info = {"backend": backend_name, "model": model_name, "device": device, "vad": vad}
+        self.batch_size = batch_size
+        self.batch_wait_s = batch_wait_ms / 1000
+        self.backend = load_backend(backend_name, model_name, device)
+        self.backend.warmup()
+        self.vad_model, self.get_speech_timestamps = load_vad(vad)
+        self.info["sample_rate"] = self.backend.sample_rate
+
+        self.started_at = time.monotonic()
+        self.groups: dict[tuple, collections.deque[LineRequest]] = {}
+        self.condition = threading.Condition()
+        self.stopping = False
+        self.metrics = {"requests": 0, "lines": 0, "batches": 0, "errors": 0, "synthesis_s": 0.0, "audio_s": 0.0}
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, lines: list[LineRequest]) -> list[bytes]:
+        """Queue the lines of a request, and wait for their WAV bytes."""
+        with self.condition:
+            self.metrics["requests"] += 1
+            for line in lines:
+                self.groups.setdefault(line.group, collections.deque()).append(line)
+            self.condition.notify()
+        return [line.future.result() for line in lines]
+
+    def stop(self) -> None:
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+        self.thread.join()
+
+    def health(self) -> dict:
+        return {"status": "ok", **self.info, "uptime_s": time.monotonic() - self.started_at}
+
+    def snapshot(self) -> dict:
+        """Counters, with the queue depth, mean batch size, real-time factor and peak memory."""
+        with self.condition:
+            metrics = dict(self.metrics)
+            metrics["queued_lines"] = sum(len(lines) for lines in self.groups.values())
+        metrics["mean_batch_size"] = metrics["lines"] / metrics["batches"] if metrics["batches"] else 0.0
+        metrics["real_time_factor"] = metrics["synthesis_s"] / metrics["audio_s"] if metrics["audio_s"] else 0.0
+        metrics["uptime_s"] = time.monotonic() - self.started_at
+        metrics["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+        import torch
+        if torch.cuda.is_available() and torch.cuda.is_initialized():
+            metrics["peak_gpu_mb"] = torch.cuda.max_memory_allocated() / 2 ** 20
+        return metrics
+
+    def _next_batch(self) -> list[LineRequest] | None:
+        """Wait for the oldest group to fill a batch, or for its oldest line to wait batch_wait_s."""
+        with self.condition:
+            while True:
+                if self.stopping:
+                    return None
+                if self.groups:
+                    group, lines = min(self.groups.items(), key=lambda item: item[1][0].queued_at)
+                    remaining = lines[0].queued_at + self.batch_wait_s - time.monotonic()
+                    if len(lines) >= self.batch_size or remaining <= 0:
+                        batch = [lines.popleft() for _ in range(min(self.batch_size, len(lines)))]
+                        if not lines:
+                            del self.groups[group]
+                        return batch
+                    self.condition.wait(remaining)
+                else:
+                    self.condition.wait()
+
+    def _run(self) -> None:
+        while (batch := self._next_batch()) is not None:
+            try:
+                wavs = self._synthesize(batch)
+            except Exception as error:
+                with self.condition:
+                    self.metrics["errors"] += 1
+                for line in batch:
+                    line.future.set_exception(error)
+                continue
+            for line, wav in zip(batch, wavs):
+                line.future.set_result(wav)
+
+    def _synthesize(self, batch: list[LineRequest]) -> list[bytes]:
+        from trim_tts import to_pcm16, trim_waveforms_with_vad, write_wav
+
+        first = batch[0]
+        sample_rate = self.backend.sample_rate
+        start = time.perf_counter()
+        wavs = self.backend.synthesize_batch([line.text for line in batch], first.speaker, first.language,
+                                             first.settings)
+        synthesis_s = time.perf_counter() - start
+        trimmed = trim_waveforms_with_vad([to_pcm16(wav) for wav in wavs], sample_rate, self.vad_model,
+                                          self.get_speech_timestamps, first.vad_buffer_ms)
+        with self.condition:
+            self.metrics["lines"] += len(batch)
+            self.metrics["batches"] += 1
+            self.metrics["synthesis_s"] += synthesis_s
+            self.metrics["audio_s"] += sum(wav.shape[-1] for wav in wavs) / sample_rate
+
+        files: list[bytes] = []
+        for pcm in trimmed:
+            buffer = io.BytesIO()
+            write_wav(buffer, pcm, sample_rate)
+            files.append(buffer.getvalue())
+        return files
+
+
+class TTSRequestHandler(BaseHTTPRequestHandler):
+    service: TTSService  # Set on the subclass made by serve()
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path == "/health":
+            self._send_json(200, self.service.health())
+        elif self.path == "/metrics":
+            self._send_json(200, self.service.snapshot())
+        else:
+            self._send_json(404, {"error": f"Unknown path: {self.path}"})
+
+    def do_POST(self) -> None:
+        if self.path != "/synthesize":
+            self._send_json(404, {"error": f"Unknown path: {self.path}"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            lines = [LineRequest(line["text"], line["speaker"], request["language"], request.get("settings", {}),
+                                 request["vad_buffer_ms"])
+                     for line in request["lines"]]
+        except (KeyError, TypeError, ValueError) as error:
+            self._send_json(400, {"error": f"Invalid request: {error!r}"})
+            return
+        try:
+            wavs = self.service.submit(lines)
+        except Exception:
+            self._send_json(500, {"error": traceback.format_exc()})
+            return
+        self._send_json(200, {"lines": [{"wav": base64.b64encode(wav).decode("ascii")} for wav in wavs]})
+
+
+def serve(service: TTSService, host: str, port: int) -> None:
+    """Answer requests until interrupted."""
+    handler = type("Handler", (TTSRequestHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"Serving {service.info['model']} on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
+
+
+class TTSClient:
+    """Client of a running TTS server."""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+
+    def _request(self, path: str, payload: dict | None = None) -> dict:
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        request = urllib.request.Request(f"{self.url}{path}", data=data,
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request) as response:
+                return json.load(response)
+        except urllib.error.HTTPError as error:
+            raise RuntimeError(f"TTS server error on {path}:\n{json.load(error).get('error')}") from None
+
+    def health(self) -> dict:
+        return self._request("/health")
+
+    def metrics(self) -> dict:
+        return self._request("/metrics")
+
+    def synthesize(self, texts: list[str], speaker: str, language: str, settings: dict,
+                   vad_buffer_ms: int) -> list[bytes]:
+        """Synthesize lines of a speaker into trimmed 16-bit PCM WAV files."""
+        response = self._request("/synthesize", {
+            "lines": [{"text": text, "speaker": speaker} for text in texts],
+            "language": language,
+            "settings": settings,
+            "vad_buffer_ms": vad_buffer_ms,
+        })
+        return [base64.b64decode(line["wav"]) for line in response["lines"]]
+
+
+def main():
+    from generate_tts import BATCH_SIZE, MODEL_NAME
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1", help="0.0.0.0 to be reached from outside a container")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--backend", default="xtts", choices=["xtts", "sine"],
+                        help="\"sine\" is a deterministic CPU stand-in for XTTS")
+    parser.add_argument("--device", default="cuda")
+    parser.add_argument("--vad", default="silero", choices=["silero", "energy"],
+                        help="\"energy\" is an offline stand-in for Silero VAD")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help="Queued lines of a speaker passed to the backend together, at least 1")
+    parser.add_argument("--batch-wait-ms", type=float, default=20,
+                        help="Longest wait of a line for other lines of its speaker")
+    args = parser.parse_args()
+
+    print("Loading TTS model and VAD...")
+    model_name = MODEL_NAME if args.backend == "xtts" else args.backend
+    service = TTSService(args.backend, model_name, args.device, args.vad, max(1, args.batch_size),
+                         args.batch_wait_ms)
+    serve(service, args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/python3
+"""Timing instrumentation of the TTS pipeline.
+
+Once enable() is called, spans and counters are appended to a JSONL file, one
+event per line, as they end. Every worker process appends to the same file
+(each event is a single O_APPEND write). Timestamps come from the system-wide
+monotonic clock, so events of all processes share a time axis.
+
+Run as a script to summarize trace files (one per run, e.g. per profile), and
+convert them to the Chrome trace-event format (chrome://tracing, Perfetto).
+"""
+import argparse
+import contextlib
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from typing import Iterator
+
+_fd: int | None = None
+
+
+def enable(trace_path: str, truncate: bool = False) -> None:
+    """Append the events of this process to trace_path, emptied first if truncate."""
+    global _fd
+    disable()
+    flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT | (os.O_TRUNC if truncate else 0)
+    _fd = os.open(trace_path, flags, 0o644)
+
+
+def disable() -> None:
+    global _fd
+    if _fd is not None:
+        os.close(_fd)
+        _fd = None
+
+
+def now_us() -> float:
+    """Current time of the trace clock, in microseconds."""
+    return time.monotonic_ns() / 1000
+
+
+def _write(event: dict) -> None:
+    event.update(pid=os.getpid(), tid=threading.get_native_id())
+    os.write(_fd, (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8"))
+
+
+def complete(name: str, start_us: float, end_us: float, **args) -> None:
+    """Record a span whose bounds were measured by the caller."""
+    if _fd is not None:
+        _write({"name": name, "ph": "X", "ts": start_us, "dur": end_us - start_us, "args": args})
+
+
+@contextlib.contextmanager
+def span(name: str, **args) -> Iterator[dict]:
+    """Record the duration of a block. The yielded args can be completed within the block."""
+    if _fd is None:
+        yield args
+        return
+    start = now_us()
+    try:
+        yield args
+    finally:
+        complete(name, start, now_us(), **args)
+
+
+def counter(name: str, **values) -> None:
+    """Record values at the current time."""
+    if _fd is not None:
+        _write({"name": name, "ph": "C", "ts": now_us(), "args": values})
+
+
+def record_memory() -> None:
+    """Record the peak resident memory of this process, and the peak CUDA memory if torch uses it."""
+    if _fd is None:
+        return
+    values = {"peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}  # KiB on Linux
+    torch = sys.modules.get("torch")  # Never imported just for this
+    if torch is not None and torch.cuda.is_available() and torch.cuda.is_initialized():
+        values["peak_gpu_mb"] = torch.cuda.max_memory_allocated() / 2 ** 20
+    counter("memory", **values)
+
+
+def load_events(trace_paths: list[str]) -> list[dict]:
+    """Read the events of JSONL trace files. A truncated last line is ignored."""
+    events: list[dict] = []
+    for trace_path in trace_paths:
+        with open(trace_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    pass  # Interrupted while writing
+    return events
+
+
+def write_chrome_trace(events: list[dict], output_path: str) -> None:
+    """Write events in the Chrome trace-event format."""
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": [{"cat": "tts", **event} for event in events], "displayTimeUnit": "ms"},
+                  f, ensure_ascii=False)
+
+
+def _table(header: list[str], rows: list[list]) -> str:
+    """Text table, numbers aligned to the right."""
+    cells = [header] + [[f"{value:.4f}" if isinstance(value, float) else str(value) for value in row]
+                        for row in rows]
+    widths = [max(len(row[col]) for row in cells) for col in range(len(header))]
+    numeric = [bool(rows) and not isinstance(rows[0][col], str) for col in range(len(header))]
+    return "\n".join("  ".join(cell.rjust(width) if is_number else cell.ljust(width)
+                               for cell, width, is_number in zip(row, widths, numeric)).rstrip()
+                     for row in cells)
+
+
+def _real_time_factors(lines: list[dict], key: str) -> list[list]:
+    groups: dict[str, list[dict]] = {}
+    for line in lines:
+        groups.setdefault(str(line["args"].get(key)), []).append(line)
+    rows = []
+    for name, group in sorted(groups.items()):
+        synthesis_s = sum(line["dur"] for line in group) / 1e6
+        audio_s = sum(line["args"]["audio_s"] for line in group)
+        rows.append([name, len(group), synthesis_s, audio_s, synthesis_s / audio_s if audio_s else 0.0])
+    return rows
+
+
+def summarize(events: list[dict], n_slowest: int = 10) -> str:
+    """Tables of the time spent per stage, the real-time factors, the slowest lines and peak memory."""
+    spans = [event for event in events if event["ph"] == "X"]
+    if not spans:
+        return "No spans recorded"
+    wall_s = (max(event["ts"] + event["dur"] for event in spans) - min(event["ts"] for event in spans)) / 1e6
+
+    stages: dict[str, list[float]] = {}
+    for event in spans:
+        stages.setdefault(event["name"], []).append(event["dur"] / 1e6)
+    stage_rows = [[name, len(durations), sum(durations), 1000 * sum(durations) / len(durations),
+                   f"{sum(durations) / wall_s:.1%}" if wall_s else "-"]
+                  for name, durations in sorted(stages.items(), key=lambda item: -sum(item[1]))]
+    sections = [f"Wall time: {wall_s:.1f} s (stages overlap across threads and workers)",
+                _table(["stage", "count", "total s", "mean ms", "of wall"], stage_rows)]
+
+    lines = [event for event in spans if event["name"] == "synthesize_line"]
+    if lines:
+        header = ["lines", "synthesis s", "audio s", "RTF"]
+        sections.append(_table(["speaker", *header], _real_time_factors(lines, "speaker")))
+        sections.append(_table(["profile", *header], _real_time_factors(lines, "profile")))
+        slowest = sorted(lines, key=lambda line: -line["dur"])[:n_slowest]
+        sections.append("Slowest lines (within a batch, the time is split by text length):\n" + _table(
+            ["dialogue", "speaker", "synthesis s", "audio s", "RTF", "text"],
+            [[line["args"]["dialogue_id"], line["args"]["speaker"], line["dur"] / 1e6, line["args"]["audio_s"],
+              line["dur"] / 1e6 / line["args"]["audio_s"] if line["args"]["audio_s"] else 0.0,
+              " ".join(line["args"]["text"].split())[:40]]  # One row per line, even for multi-line dialogues
+             for line in slowest]))
+
+    memory = [event["args"] for event in events if event["name"] == "memory"]
+    if memory:
+        peaks = [f"{max(values.get(name, 0) for values in memory):.0f} MB {label}"
+                 for name, label in (("peak_rss_mb", "CPU (largest process)"), ("peak_gpu_mb", "GPU"))
+                 if any(name in values for values in memory)]
+        sections.append(f"Peak memory: {', '.join(peaks)}")
+    return "\n\n".join(sections)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize TTS trace files, and convert them for chrome://tracing.")
+    parser.add_argument("trace_jsonl", nargs="+")
+    parser.add_argument("--chrome", help="Write the events of every file in the Chrome trace-event format")
+    parser.add_argument("--slowest", type=int, default=10, help="Number of slowest lines listed")
+    args = parser.parse_args()
+
+    events = load_events(args.trace_jsonl)
+    print(summarize(events, args.slowest))
+    if args.chrome:
+        write_chrome_trace(events, args.chrome)
+        print(f"Chrome trace in {args.chrome}")
+
+
+if __name__ == "__main__":
+    main()
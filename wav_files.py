@@ -0,0 +1,44 @@
+"""WAV file helpers, without any audio library."""
+import os
+import struct
+
+
+def read_wav_header(path: str) -> tuple[int, int] | None:
+    """Return (sample_rate, n_frames) of a WAV file, None if it is malformed or truncated."""
+    try:
+        with open(path, "rb") as f:
+            file_size = os.fstat(f.fileno()).st_size
+            riff = f.read(12)
+            if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+                return None
+
+            sample_rate = block_align = None
+            while chunk_header := f.read(8):
+                if len(chunk_header) < 8:
+                    return None
+                chunk_id, chunk_size = struct.unpack("<4sI", chunk_header)
+                if chunk_id == b"fmt ":
+                    fmt = f.read(chunk_size)
+                    if len(fmt) < 16:
+                        return None
+                    _, _, sample_rate, _, block_align = struct.unpack("<HHIIH", fmt[:14])
+                    f.seek(chunk_size % 2, os.SEEK_CUR)
+                elif chunk_id == b"data":
+                    if sample_rate is None or not block_align or f.tell() + chunk_size > file_size:
+                        return None
+                    return sample_rate, chunk_size // block_align
+                else:
+                    f.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+    except OSError:
+        return None
+    return None
+
+
+def find_wav_files(root_dir: str) -> list[str]:
+    """List the WAV files of a tree, skipping hidden directories such as .cache."""
+    paths: list[str] = []
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        dirnames[:] = sorted(dirname for dirname in dirnames if not dirname.startswith("."))
+        paths.extend(os.path.join(dirpath, filename) for filename in sorted(filenames)
+                     if filename.endswith(".wav") and not filename.endswith(".tmp.wav"))
+    return paths